@@ -4,7 +4,15 @@ import datetime
 import time
 import traceback # Import traceback for logging
 from flask import Flask, request, jsonify, render_template, url_for # Added url_for
-import numpy as np # Using numpy for some math functions
+import os
+import sys
+# param_schema.py and lazy_imports.py live in the repository root and are shared with the
+# online app (see README.md). Appended, so this folder's own modules still come first
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import param_schema
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy', globals(), 'np') # Only needed for NumPy values; the simulation here is plain Python
 # Removed requests library as it's no longer needed for NOAA fetching
 
 # --- Configuration & Constants ---
@@ -12,6 +20,8 @@ import numpy as np # Using numpy for some math functions
 
 MAX_FREQ_STEPS = 100 # Limit frequency steps for DoS prevention
 MAX_TX_POWER = 10000 # Example limit for Tx Power (Watts)
+MAX_BATCH_ITEMS = 5000 # Simulations accepted in one batched /simulate request
+MAX_BATCH_FREQ_STEPS = 20000 # Total frequency steps across a batch
 # Define reasonable ranges/defaults for user inputs
 DEFAULT_SFI = 120
 DEFAULT_SSN = 70
@@ -50,9 +60,19 @@ ANTENNA_PARAMS = {
 ALLOWED_ANTENNA_TYPES = list(ANTENNA_PARAMS['type'].keys())
 ALLOWED_ANTENNA_HEIGHTS = list(ANTENNA_PARAMS['height'].keys())
 
+# Declarative input validation, compiled once (see param_schema.py)
+SIMULATION_SCHEMA = param_schema.compile_schema(param_schema.simulation_checks(
+    MAX_TX_POWER, MAX_FREQ_STEPS, ALLOWED_ANTENNA_TYPES, ALLOWED_ANTENNA_HEIGHTS, ALLOWED_NOISE_ENV,
+    extra_numeric_fields=[
+        param_schema.number_field('sfi', MIN_SFI, MAX_SFI, f"SFI out of range ({MIN_SFI} to {MAX_SFI}).", integer=True),
+        param_schema.number_field('ssn', MIN_SSN, MAX_SSN, f"SSN out of range ({MIN_SSN} to {MAX_SSN}).", integer=True),
+        param_schema.number_field('kp', MIN_KP, MAX_KP, f"Kp out of range ({MIN_KP} to {MAX_KP}).", integer=True),
+    ]))
+
 
 # --- Flask App Initialization ---
 app = Flask(__name__) # static_url_path='', static_folder='static') might be needed depending on structure
+app.jinja_env.get_template('index.html') # Compile at startup rather than on the first page load
 
 # --- Removed Security Headers for Simplicity in Offline Context ---
 # (Can be added back if deployed in a controlled network environment)
@@ -103,6 +123,9 @@ def calculate_noise_floor_dbm(noise_environment_name):
     noise_floor_dbm = noise_power_dbm + noise_figure_db
     return {'noiseFloorDbm': noise_floor_dbm, 'noiseFigureDb': noise_figure_db}
 
+# Precomputed at import, as they are the same for every request
+NOISE_FLOORS = {name: calculate_noise_floor_dbm(name) for name in NOISE_FIGURES}
+
 # estimate_muf_fot now uses passed SSN
 def estimate_muf_fot(lat1, lon1, lat2, lon2, dt_utc, ssn):
     """VERY simplified MUF/FOT estimation."""
@@ -234,7 +257,7 @@ def run_hf_simulation(params):
     time_of_day_str = "Day" if is_day else "Night"
 
     muf_data = estimate_muf_fot(lat1, lon1, lat2, lon2, dt_utc, ssn) # Pass SSN
-    noise_floor_info = calculate_noise_floor_dbm(noise_environment)
+    noise_floor_info = NOISE_FLOORS.get(noise_environment) or calculate_noise_floor_dbm(noise_environment)
     noise_floor_dbm = noise_floor_info['noiseFloorDbm']
     noise_figure_db = noise_floor_info['noiseFigureDb']
     tx_gain_dbi = get_antenna_gain(tx_antenna_type, tx_antenna_height)
@@ -302,70 +325,22 @@ def simulate():
         if not params:
              return jsonify({"error": "Invalid JSON payload received."}), 400
 
-        # --- Enhanced Input Validation ---
-        validated_params = {}
-        # Add sfi, ssn, kp to required keys
-        required_keys = ['txLat', 'txLon', 'rxLat', 'rxLon', 'txPowerW',
-                         'startFreq', 'endFreq', 'freqSteps',
-                         'sfi', 'ssn', 'kp', # Added indices
-                         'txAntennaType', 'txAntennaHeight', 'rxAntennaType', 'rxAntennaHeight',
-                         'noiseEnvironment']
-        missing_keys = [key for key in required_keys if key not in params]
-        if missing_keys:
-             return jsonify({"error": f"Missing required parameters: {', '.join(missing_keys)}"}), 400
-
-        # Validate numeric types and ranges
+        if isinstance(params, list):
+            # Batch request: per-item errors by index
+            try:
+                validated, errors = param_schema.validate_simulation_batch(
+                    SIMULATION_SCHEMA, params, MAX_BATCH_ITEMS, MAX_BATCH_FREQ_STEPS)
+            except ValueError as e:
+                 return jsonify({"error": str(e)}), 400
+            results = [{"index": index, "results": run_hf_simulation(item)}
+                       for index, item in enumerate(validated) if item is not None]
+            return jsonify({"errors": errors, "results": results})
+
+        # --- Input Validation ---
         try:
-            # Lat/Lon
-            validated_params['txLat'] = float(params['txLat'])
-            if not (-90 <= validated_params['txLat'] <= 90): raise ValueError("Tx Latitude out of range (-90 to 90).")
-            validated_params['txLon'] = float(params['txLon'])
-            if not (-180 <= validated_params['txLon'] <= 180): raise ValueError("Tx Longitude out of range (-180 to 180).")
-            validated_params['rxLat'] = float(params['rxLat'])
-            if not (-90 <= validated_params['rxLat'] <= 90): raise ValueError("Rx Latitude out of range (-90 to 90).")
-            validated_params['rxLon'] = float(params['rxLon'])
-            if not (-180 <= validated_params['rxLon'] <= 180): raise ValueError("Rx Longitude out of range (-180 to 180).")
-
-            # Power/Freq/Steps
-            validated_params['txPowerW'] = float(params['txPowerW'])
-            if not (0 < validated_params['txPowerW'] <= MAX_TX_POWER): raise ValueError(f"Tx Power must be between 0 and {MAX_TX_POWER} Watts.")
-            validated_params['startFreq'] = float(params['startFreq'])
-            if not (1.8 <= validated_params['startFreq'] <= 30.0): raise ValueError("Start Frequency out of range (1.8 to 30.0 MHz).")
-            validated_params['endFreq'] = float(params['endFreq'])
-            if not (1.8 <= validated_params['endFreq'] <= 30.0): raise ValueError("End Frequency out of range (1.8 to 30.0 MHz).")
-            if validated_params['endFreq'] < validated_params['startFreq']: raise ValueError("End Frequency must be >= Start Frequency.")
-            validated_params['freqSteps'] = int(params['freqSteps'])
-            if not (1 <= validated_params['freqSteps'] <= MAX_FREQ_STEPS): raise ValueError(f"Frequency Steps must be between 1 and {MAX_FREQ_STEPS}.")
-            if validated_params['freqSteps'] > 1 and validated_params['endFreq'] == validated_params['startFreq']:
-                raise ValueError("Start and End Frequency cannot be the same when Steps > 1.")
-
-            # Indices Validation
-            validated_params['sfi'] = int(params['sfi'])
-            if not (MIN_SFI <= validated_params['sfi'] <= MAX_SFI): raise ValueError(f"SFI out of range ({MIN_SFI} to {MAX_SFI}).")
-            validated_params['ssn'] = int(params['ssn'])
-            if not (MIN_SSN <= validated_params['ssn'] <= MAX_SSN): raise ValueError(f"SSN out of range ({MIN_SSN} to {MAX_SSN}).")
-            validated_params['kp'] = int(params['kp'])
-            if not (MIN_KP <= validated_params['kp'] <= MAX_KP): raise ValueError(f"Kp out of range ({MIN_KP} to {MAX_KP}).")
-
-        except (ValueError, TypeError) as e:
-             return jsonify({"error": f"Invalid numeric parameter: {e}"}), 400
-
-        # Validate string selections
-        validated_params['txAntennaType'] = params['txAntennaType']
-        if validated_params['txAntennaType'] not in ALLOWED_ANTENNA_TYPES:
-             return jsonify({"error": f"Invalid Tx Antenna Type: {validated_params['txAntennaType']}"}), 400
-        validated_params['txAntennaHeight'] = params['txAntennaHeight']
-        if validated_params['txAntennaHeight'] not in ALLOWED_ANTENNA_HEIGHTS:
-             return jsonify({"error": f"Invalid Tx Antenna Height: {validated_params['txAntennaHeight']}"}), 400
-        validated_params['rxAntennaType'] = params['rxAntennaType']
-        if validated_params['rxAntennaType'] not in ALLOWED_ANTENNA_TYPES:
-             return jsonify({"error": f"Invalid Rx Antenna Type: {validated_params['rxAntennaType']}"}), 400
-        validated_params['rxAntennaHeight'] = params['rxAntennaHeight']
-        if validated_params['rxAntennaHeight'] not in ALLOWED_ANTENNA_HEIGHTS:
-             return jsonify({"error": f"Invalid Rx Antenna Height: {validated_params['rxAntennaHeight']}"}), 400
-        validated_params['noiseEnvironment'] = params['noiseEnvironment']
-        if validated_params['noiseEnvironment'] not in ALLOWED_NOISE_ENV:
-             return jsonify({"error": f"Invalid Noise Environment: {validated_params['noiseEnvironment']}"}), 400
+            validated_params = SIMULATION_SCHEMA.validate(params)
+        except ValueError as e:
+             return jsonify({"error": str(e)}), 400
 
         # --- Validation Passed ---
         results = run_hf_simulation(validated_params)
@@ -1,21 +1,109 @@
 import math
+import os
 import json
 import datetime
+import collections
+import functools
+import heapq
 import time
+import threading
 import traceback # Import traceback for logging
-from flask import Flask, request, jsonify, render_template, make_response
-import requests
-import numpy as np # Using numpy for some math functions
+import uuid
+import param_schema
+from lazy_imports import lazy_import
+try:
+    import fcntl # Locks the popular path list while worker processes merge into it
+except ImportError: # Windows
+    fcntl = None
+
+# Heavy modules are imported on first use: asgi.py never needs Flask, requests is only
+# used by NOAA fetches and NumPy by the simulation, which the startup warm-up runs in
+# the background (see the Startup section)
+flask = lazy_import('flask', globals(), 'flask')
+requests = lazy_import('requests', globals(), 'requests')
+np = lazy_import('numpy', globals(), 'np') # Using numpy for some math functions
 
 # --- Configuration & Constants ---
 # Cache for NOAA data to avoid hitting the API too often
+# etag/last_modified hold the upstream validators used for conditional requests
 NOAA_CACHE = {
-    'radio_flux': {'data': None, 'timestamp': 0}, # Using solar-radio-flux for SFI
-    'kp_7day': {'data': None, 'timestamp': 0},    # Using 7-day Kp forecast for Kp
+    'radio_flux': {'data': None, 'timestamp': 0, 'etag': None, 'last_modified': None, 'failed_at': 0}, # Using solar-radio-flux for SFI
+    'kp_7day': {'data': None, 'timestamp': 0, 'etag': None, 'last_modified': None, 'failed_at': 0},    # Using 7-day Kp forecast for Kp
+}
+CACHE_DURATION_SECONDS = 15 * 60 # Default cache duration for products without their own refresh interval
+# Per-product refresh intervals: F10.7 is measured a few times a day, the Kp file updates every few minutes
+NOAA_REFRESH_SECONDS = {
+    'radio_flux': 60 * 60,
+    'kp_7day': 15 * 60,
+}
+# NOAA_CACHE_SECONDS overrides every product's interval (e.g. 0 to force upstream fetches in load tests)
+if os.environ.get('NOAA_CACHE_SECONDS'):
+    NOAA_REFRESH_SECONDS = {product_key: int(os.environ['NOAA_CACHE_SECONDS']) for product_key in NOAA_REFRESH_SECONDS}
+# Pooled session settings for SWPC fetches
+NOAA_TIMEOUT_SECONDS = 10
+NOAA_MAX_RETRIES = 3
+NOAA_RETRY_BACKOFF_SECONDS = 0.5 # Sleeps 0.5s, 1s, 2s between retries
+NOAA_RETRY_STATUSES = (429, 500, 502, 503, 504)
+NOAA_POOL_SIZE = 10
+NOAA_FAILURE_BACKOFF_SECONDS = 60 # After a failed fetch, serve cached/default data for this long before retrying
+# Fetches (retries included, up to ~43 s against a stalled SWPC) run in the background. A
+# request waits for them at most this long, and only when nothing is cached yet, then
+# falls back to the default indices
+NOAA_REQUEST_WAIT_SECONDS = NOAA_TIMEOUT_SECONDS
+# SWPC endpoints; NOAA_BASE_URL can point at a local stub for load testing
+NOAA_BASE_URL = os.environ.get('NOAA_BASE_URL', 'https://services.swpc.noaa.gov').rstrip('/')
+NOAA_URLS = {
+    'radio_flux': NOAA_BASE_URL + '/json/solar-radio-flux.json',
+    'kp_7day': NOAA_BASE_URL + '/json/geospace/geospce_pred_est_kp_7_day.json',
 }
-CACHE_DURATION_SECONDS = 15 * 60 # Cache data for 15 minutes
 MAX_FREQ_STEPS = 100 # Limit frequency steps for DoS prevention
 MAX_TX_POWER = 10000 # Example limit for Tx Power (Watts)
+MAX_BATCH_ITEMS = 5000 # Simulations accepted in one batched /simulate request
+MAX_BATCH_FREQ_STEPS = 20000 # Total frequency steps across a batch
+
+# Cache of propagation stages keyed by result id, used by /simulate/update
+# to recompute only the link budget when power/antenna/noise inputs change.
+# It lives in each worker process: behind several workers an update can reach
+# one that never saw the result and get a 404, after which the page falls back
+# to a full /simulate. Use sticky sessions to keep updates on the same worker.
+# Entries are kept least recently used first; each use extends an entry's life,
+# and the cache is bounded by memory (SIMULATION_CACHE_MAX_BYTES, default 64 MB,
+# about 10k results of 100 frequency steps).
+SIMULATION_CACHE = collections.OrderedDict()
+SIMULATION_CACHE_LOCK = threading.Lock()
+SIMULATION_CACHE_DURATION_SECONDS = 15 * 60 # Since the result was last used
+SIMULATION_CACHE_MAX_BYTES = int(os.environ.get('SIMULATION_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+SIMULATION_CACHE_ENTRY_OVERHEAD_BYTES = 1500 # Stage dict, result id and cache entry, on top of the columns
+simulation_cache_bytes = 0
+
+# Warm cache of popular paths. Requests are counted per quantized path and a
+# background thread keeps the propagation stages of the most requested ones
+# precomputed (see the Popular Path Precompute section). Environment:
+#   PRECOMPUTE_ENABLED          - '0' disables tracking and precompute
+#   PRECOMPUTE_TOP_PATHS        - how many of the most requested paths to keep warm
+#   PRECOMPUTE_INTERVAL_SECONDS - recompute at least this often (also after each space-weather change);
+#                                 warm stages are served for at most twice this long
+#   PRECOMPUTE_MAX_CPU_FRACTION - share of one core the precompute thread may use
+#   PRECOMPUTE_COORD_STEP_DEG   - coordinates are rounded to this grid to group requests
+#   POPULAR_PATHS_FILE          - where the popular path list is persisted and merged across
+#                                 worker processes ('' disables)
+PRECOMPUTE_ENABLED = os.environ.get('PRECOMPUTE_ENABLED', '1') != '0'
+PRECOMPUTE_TOP_PATHS = int(os.environ.get('PRECOMPUTE_TOP_PATHS', '50'))
+PRECOMPUTE_INTERVAL_SECONDS = float(os.environ.get('PRECOMPUTE_INTERVAL_SECONDS', '30'))
+PRECOMPUTE_MAX_CPU_FRACTION = float(os.environ.get('PRECOMPUTE_MAX_CPU_FRACTION', '0.25'))
+PRECOMPUTE_COORD_STEP_DEG = float(os.environ.get('PRECOMPUTE_COORD_STEP_DEG', '0.1'))
+POPULAR_PATHS_FILE = os.environ.get(
+    'POPULAR_PATHS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'popular_paths.json'))
+PRECOMPUTE_CHUNK_PATHS = 16 # Paths per batch between CPU-limiting pauses
+# Warm stages age with the sun's position: at the default 60 s the solar zenith angle is off by at most 0.25°
+WARM_CACHE_MAX_AGE_SECONDS = 2 * PRECOMPUTE_INTERVAL_SECONDS
+PATH_SCORE_HALF_LIFE_SECONDS = 60 * 60 # Request counts halve every hour so rankings follow recent traffic
+MIN_PATH_SCORE = 0.1 # Paths whose decayed count falls below this are forgotten
+MAX_TRACKED_PATHS = 5000
+PATH_EVICTION_FRACTION = 0.1 # Share of tracked paths, least popular first, forgotten to admit a new one when full
+
+# Startup warm-up (see the Startup section). READINESS_ENDPOINT='0' disables the /ready route.
+READINESS_ENDPOINT_ENABLED = os.environ.get('READINESS_ENDPOINT', '1') != '0'
 
 # Physics Constants
 C = 299792458  # Speed of light m/s
@@ -46,65 +134,200 @@ ANTENNA_PARAMS = {
 ALLOWED_ANTENNA_TYPES = list(ANTENNA_PARAMS['type'].keys())
 ALLOWED_ANTENNA_HEIGHTS = list(ANTENNA_PARAMS['height'].keys())
 
+# Enum codes for the compact result columns (see PROPAGATION_DTYPE/LINK_BUDGET_DTYPE)
+MODE_NAMES = ('N/A', 'E Layer', 'F Layer', 'Above F2 MUF')
+MODE_NA, MODE_E_LAYER, MODE_F_LAYER, MODE_ABOVE_F2_MUF = range(len(MODE_NAMES))
+LIKELIHOOD_NAMES = ('Poor', 'Fair', 'Good', 'Fair (GW?)')
+LIKELIHOOD_POOR, LIKELIHOOD_FAIR, LIKELIHOOD_GOOD, LIKELIHOOD_FAIR_GW = range(len(LIKELIHOOD_NAMES))
 
-# --- Flask App Initialization ---
-app = Flask(__name__)
+# Per-frequency result columns; values shared by all frequencies are stored once per result.
+# Kept as field lists (NumPy accepts them as dtypes) so that defining them doesn't import NumPy.
+PROPAGATION_DTYPE = [
+    ('frequency_mhz', 'f8'), ('absorption_db', 'f8'), ('fspl_db', 'f8'),
+    ('skywave_extra_loss_db', 'i4'), ('skywave_total_loss_db', 'f8'), ('ground_wave_total_loss_db', 'f8'),
+    ('mode', 'u1'),
+]
+LINK_BUDGET_DTYPE = [('skywave_snr', 'f8'), ('ground_wave_snr', 'f8'), ('likelihood', 'u1')]
 
 # --- Security Headers ---
-@app.after_request
-def add_security_headers(response):
+# Shared with the ASGI app (asgi.py) so both serving modes send the same headers.
+SECURITY_HEADERS = {
     # Prevent MIME type sniffing
-    response.headers['X-Content-Type-Options'] = 'nosniff'
+    'X-Content-Type-Options': 'nosniff',
     # Prevent clickjacking
-    response.headers['X-Frame-Options'] = 'SAMEORIGIN'
+    'X-Frame-Options': 'SAMEORIGIN',
     # Control referrer information
-    response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
     # Basic Content Security Policy (adjust as needed)
-    csp = (
+    'Content-Security-Policy': (
         "default-src 'self'; "
         "script-src 'self' 'unsafe-inline' https://unpkg.com https://cdn.tailwindcss.com; "
         "style-src 'self' 'unsafe-inline' https://unpkg.com; "
         "img-src 'self' data: https://*.tile.openstreetmap.org; "
         "font-src 'self' https://cdn.jsdelivr.net; "
         "connect-src 'self';" # Allows fetch requests to own origin (/simulate)
-    )
-    response.headers['Content-Security-Policy'] = csp
+    ),
     # Optional: HTTP Strict Transport Security (only if using HTTPS)
-    # response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
+    # 'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+}
+
+def add_security_headers(response):
+    for header, value in SECURITY_HEADERS.items():
+        response.headers[header] = value
     return response
 
 
 # --- NOAA Data Fetching ---
-def get_noaa_data(product_key, url):
-    """Fetches data from NOAA SWPC URL with simple caching."""
-    now = time.time()
+def create_noaa_session():
+    """Creates a keep-alive session with a connection pool and retry/backoff for SWPC fetches."""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    retries = Retry(total=NOAA_MAX_RETRIES, backoff_factor=NOAA_RETRY_BACKOFF_SECONDS,
+                    status_forcelist=NOAA_RETRY_STATUSES, allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=len(NOAA_URLS), pool_maxsize=NOAA_POOL_SIZE, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+NOAA_SESSION = None # Created on the first fetch, see get_noaa_session()
+NOAA_SESSION_LOCK = threading.Lock()
+# Only one fetch per product goes upstream at a time, in its own thread; callers
+# (e.g. the first request during the startup warm-up) wait on it or serve stale data
+NOAA_REFRESH_THREADS = {} # product key -> thread fetching it
+NOAA_REFRESH_LOCK = threading.Lock()
+
+def get_noaa_session():
+    """Returns the shared SWPC session, creating it (and importing requests) on first use."""
+    global NOAA_SESSION
+    if NOAA_SESSION is None:
+        with NOAA_SESSION_LOCK:
+            if NOAA_SESSION is None:
+                NOAA_SESSION = create_noaa_session()
+    return NOAA_SESSION
+
+
+def get_noaa_refresh_seconds(product_key):
+    """Returns how long cached data for a product stays fresh."""
+    return NOAA_REFRESH_SECONDS.get(product_key, CACHE_DURATION_SECONDS)
+
+
+def get_conditional_headers(cache_entry):
+    """Builds If-None-Match/If-Modified-Since headers from a cache entry's upstream validators."""
+    headers = {}
+    if cache_entry and cache_entry['data'] is not None:
+        if cache_entry.get('etag'): headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry.get('last_modified'): headers['If-Modified-Since'] = cache_entry['last_modified']
+    return headers
+
+
+def is_noaa_cache_fresh(product_key, cache_entry, now):
+    """True if the cache entry can be served without going upstream (fresh, or in failure backoff)."""
+    if not cache_entry:
+        return False
+    return (now - cache_entry['timestamp'] < get_noaa_refresh_seconds(product_key) or
+            now - cache_entry.get('failed_at', 0) < NOAA_FAILURE_BACKOFF_SECONDS)
+
+
+def store_noaa_data(product_key, data, response_headers, now):
+    """Caches freshly fetched data along with its ETag/Last-Modified validators."""
+    previous_entry = NOAA_CACHE.get(product_key)
+    if previous_entry is None or previous_entry['data'] != data:
+        PRECOMPUTE_WAKE_EVENT.set() # Space weather changed: refresh the warm cache
+    NOAA_CACHE[product_key] = {
+        'data': data, 'timestamp': now,
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+        'failed_at': 0,
+    }
+
+
+def mark_noaa_failure(product_key, now):
+    """Records a failed fetch so requests don't each pay the retry cost while SWPC is down."""
+    cache_entry = NOAA_CACHE.setdefault(product_key, {'data': None, 'timestamp': 0, 'etag': None, 'last_modified': None})
+    cache_entry['failed_at'] = now
+    return cache_entry['data']
+
+
+def get_noaa_data(product_key, url, wait_seconds=NOAA_REQUEST_WAIT_SECONDS):
+    """Returns a product's data from the cache, refreshing it in the background when it is due.
+
+    Stale data is served straight away while the refresh runs. With nothing cached yet, waits
+    up to wait_seconds (None: until the refresh ends, retries included) and returns None if
+    there is still nothing, so the caller falls back to defaults.
+    """
     cache_entry = NOAA_CACHE.get(product_key)
 
     # Check cache first
-    if cache_entry and (now - cache_entry['timestamp'] < CACHE_DURATION_SECONDS):
+    if is_noaa_cache_fresh(product_key, cache_entry, time.time()):
         # print(f"Using cached data for {product_key}")
         return cache_entry['data']
 
+    refresh_thread = refresh_noaa_data(product_key, url)
+    if cache_entry is None or cache_entry['data'] is None:
+        refresh_thread.join(wait_seconds)
+        cache_entry = NOAA_CACHE.get(product_key)
+    return cache_entry['data'] if cache_entry else None
+
+
+def refresh_noaa_data(product_key, url):
+    """Starts fetching one product in a background thread, unless one is already; returns that thread."""
+    with NOAA_REFRESH_LOCK:
+        refresh_thread = NOAA_REFRESH_THREADS.get(product_key)
+        if refresh_thread is None or not refresh_thread.is_alive():
+            refresh_thread = threading.Thread(target=run_noaa_refresh, args=(product_key, url),
+                                              name=f'noaa-refresh-{product_key}', daemon=True)
+            NOAA_REFRESH_THREADS[product_key] = refresh_thread
+            refresh_thread.start()
+    return refresh_thread
+
+
+def run_noaa_refresh(product_key, url):
+    now = time.time()
+    cache_entry = NOAA_CACHE.get(product_key)
+    if not is_noaa_cache_fresh(product_key, cache_entry, now): # Unless a refresh just ended
+        fetch_noaa_data(product_key, url, cache_entry, now)
+
+
+def fetch_noaa_data(product_key, url, cache_entry, now):
+    """Fetches one product upstream; runs in the product's refresh thread (see refresh_noaa_data)."""
     try:
         # print(f"Fetching fresh data for {product_key} from {url}")
-        response = requests.get(url, timeout=10) # Added timeout
+        response = get_noaa_session().get(url, headers=get_conditional_headers(cache_entry), timeout=NOAA_TIMEOUT_SECONDS)
+        if response.status_code == 304 and cache_entry and cache_entry['data'] is not None:
+            # Unchanged upstream: keep the already-parsed data and just extend its TTL
+            cache_entry['timestamp'] = now
+            return cache_entry['data']
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         data = response.json()
         # Update cache only if fetch and parse are successful
-        NOAA_CACHE[product_key] = {'data': data, 'timestamp': now}
+        store_noaa_data(product_key, data, response.headers, now)
         return data
     except requests.exceptions.RequestException as e:
         print(f"Error fetching NOAA data for {product_key}: {e}")
         # Return old cached data if available on fetch error, otherwise None
-        return cache_entry['data'] if cache_entry else None
+        return mark_noaa_failure(product_key, now)
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON for {product_key}: {e}")
         # Return old cached data if available on parse error, otherwise None
-        return cache_entry['data'] if cache_entry else None
+        return mark_noaa_failure(product_key, now)
 
 
-def get_latest_indices():
-    """Extracts latest SFI, SSN, Kp, Ap from cached/fetched NOAA data."""
+def get_latest_indices(wait_seconds=NOAA_REQUEST_WAIT_SECONDS):
+    """Extracts latest SFI, SSN, Kp, Ap from cached/fetched NOAA data (see get_noaa_data for wait_seconds)."""
+    now = time.time()
+    for product_key, url in NOAA_URLS.items(): # Due products are refreshed in parallel
+        if not is_noaa_cache_fresh(product_key, NOAA_CACHE.get(product_key), now):
+            refresh_noaa_data(product_key, url)
+    deadline = None if wait_seconds is None else time.monotonic() + wait_seconds
+    remaining = lambda: None if deadline is None else max(0, deadline - time.monotonic())
+    srf_data = get_noaa_data('radio_flux', NOAA_URLS['radio_flux'], remaining())
+    kp_data = get_noaa_data('kp_7day', NOAA_URLS['kp_7day'], remaining())
+    return parse_latest_indices(srf_data, kp_data)
+
+
+def parse_latest_indices(srf_data, kp_data):
+    """Extracts latest SFI, SSN, Kp, Ap from raw solar-radio-flux and Kp JSON (either may be None)."""
     sfi = 80 # Default fallback
     ssn = 10 # Default fallback (Using default as reliable daily JSON source unclear)
     kp = 2   # Default fallback
@@ -112,8 +335,7 @@ def get_latest_indices():
 
     # --- Get SFI (F10.7) using solar-radio-flux ---
     # Structure is array of objects: [{"time_tag": "...", "flux": ..., "observed_or_predicted": "OBSERVED"}, ...]
-    srf_url = 'https://services.swpc.noaa.gov/json/solar-radio-flux.json'
-    srf_data = get_noaa_data('radio_flux', srf_url)
+    srf_url = NOAA_URLS['radio_flux']
     if srf_data and isinstance(srf_data, list) and len(srf_data) > 0:
         try:
             # Find the latest OBSERVED flux value
@@ -135,8 +357,7 @@ def get_latest_indices():
 
     # --- Get Kp using 7-day forecast file ---
     # Structure is array, index 0=header, data rows: ["time_tag", kp_value, "status"] where status="observed", "estimated", "predicted"
-    kp_url = 'https://services.swpc.noaa.gov/json/geospace/geospce_pred_est_kp_7_day.json'
-    kp_data = get_noaa_data('kp_7day', kp_url)
+    kp_url = NOAA_URLS['kp_7day']
     if kp_data and isinstance(kp_data, list) and len(kp_data) > 1: # Need header + data
          try:
              # Find the last entry marked as 'observed'
@@ -173,39 +394,9 @@ def get_latest_indices():
 
     return {'sfi': sfi, 'ssn': ssn, 'kp': kp, 'ap': ap}
 
-# --- Geographic & Time Helpers ---
-# calculate_distance, get_solar_zenith_angle remain the same
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate great-circle distance using Haversine formula."""
-    R = 6371  # Earth radius in km
-    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-def get_solar_zenith_angle(lat, lon, dt_utc):
-    """Approximate solar zenith angle."""
-    day_of_year = dt_utc.timetuple().tm_yday
-    hour_utc = dt_utc.hour + dt_utc.minute / 60.0 + dt_utc.second / 3600.0
-    declination = -23.44 * math.cos(math.radians(360.0 / 365.25 * (day_of_year + 10)))
-    hour_angle = 15.0 * (hour_utc - 12.0) + lon
-    lat_rad = math.radians(lat)
-    decl_rad = math.radians(declination)
-    ha_rad = math.radians(hour_angle)
-    cos_zenith = (math.sin(lat_rad) * math.sin(decl_rad) +
-                  math.cos(lat_rad) * math.cos(decl_rad) * math.cos(ha_rad))
-    cos_zenith = max(-1.0, min(1.0, cos_zenith))
-    zenith_angle_rad = math.acos(cos_zenith)
-    zenith_angle_deg = math.degrees(zenith_angle_rad)
-    return zenith_angle_deg
-
 # --- Propagation Modeling Helpers ---
-# calculate_noise_floor_dbm, estimate_muf_fot, calculate_absorption,
-# calculate_path_loss, get_antenna_gain, calculate_snr, isfinite
-# remain the same as the previous version.
+# Scalar helpers for the link budget; the propagation model itself works on
+# arrays (see Path Geometry and run_propagation_stages).
 
 def calculate_noise_floor_dbm(noise_environment_name):
     """Calculates the receiver noise floor in dBm."""
@@ -216,73 +407,8 @@ def calculate_noise_floor_dbm(noise_environment_name):
     noise_floor_dbm = noise_power_dbm + noise_figure_db
     return {'noiseFloorDbm': noise_floor_dbm, 'noiseFigureDb': noise_figure_db}
 
-def estimate_muf_fot(lat1, lon1, lat2, lon2, dt_utc, ssn):
-    """VERY simplified MUF/FOT estimation."""
-    mid_lat = (lat1 + lat2) / 2
-    lon_diff = lon2 - lon1
-    if lon_diff > 180: mid_lon = (lon1 + lon2 - 360) / 2
-    elif lon_diff < -180: mid_lon = (lon1 + lon2 + 360) / 2
-    else: mid_lon = (lon1 + lon2) / 2
-    if mid_lon > 180: mid_lon -= 360
-    if mid_lon < -180: mid_lon += 360
-    zenith_angle = get_solar_zenith_angle(mid_lat, mid_lon, dt_utc)
-    ssn_factor = 10 + (ssn * 0.1)
-    zenith_factor = max(0, math.cos(math.radians(zenith_angle)))**0.5
-    estimated_f2_muf = ssn_factor * (1 + 1.5 * zenith_factor)
-    estimated_f2_muf = max(5.0, min(estimated_f2_muf, 50.0))
-    estimated_e_muf = (5 + 10 * zenith_factor)
-    estimated_e_muf = max(3.0, min(estimated_e_muf, 25.0))
-    estimated_f2_fot = estimated_f2_muf * 0.85
-    estimated_e_fot = estimated_e_muf * 0.85
-    return {
-        'f2_muf': estimated_f2_muf, 'f2_fot': estimated_f2_fot,
-        'e_muf': estimated_e_muf, 'e_fot': estimated_e_fot
-    }
-
-def calculate_absorption(frequency_mhz, zenith_angle, kp, path_mid_lat, sfi):
-    """Simplified D-layer and Auroral absorption calculation."""
-    absorption_db = 0
-    if zenith_angle < 95:
-        cos_chi = max(0, math.cos(math.radians(zenith_angle)))
-        d_layer_abs = (1 + 0.01 * sfi) * (15 * cos_chi**0.8) / ((frequency_mhz + 0.6)**1.8)
-        absorption_db += max(0, d_layer_abs)
-    auroral_lat_threshold = 58
-    if abs(path_mid_lat) > auroral_lat_threshold:
-        kp_factor = max(0, kp - 1)
-        lat_scale = 1 + (abs(path_mid_lat) - auroral_lat_threshold) / 15
-        auroral_abs = (kp_factor**1.8 * lat_scale * 3) / (frequency_mhz**0.5)
-        absorption_db += max(0, auroral_abs)
-    return absorption_db
-
-def calculate_path_loss(distance_km, frequency_mhz, muf_data, is_day, zenith_angle):
-    """Calculate path loss including FSPL and simplified mode/extra losses."""
-    if frequency_mhz <= 0: frequency_mhz = 1.8
-    fspl_db = 20 * math.log10(max(1.0, distance_km * 1000)) + 20 * math.log10(frequency_mhz * 1e6) - 147.55
-    if not isfinite(fspl_db): return {'skywave_total_loss': float('inf'), 'ground_wave_total_loss': float('inf'), 'mode': 'N/A', 'fspl': float('inf'), 'skywave_extra_loss': 0, 'ground_wave_extra_loss': 0}
-    mode = "N/A"
-    extra_loss_db = 50
-    if frequency_mhz > muf_data['f2_muf']:
-        mode = "Above F2 MUF"
-        extra_loss_db = 100
-    elif is_day and frequency_mhz <= muf_data['e_muf']:
-        mode = "E Layer"
-        hops = max(1, math.ceil(distance_km / 1500))
-        extra_loss_db = 18 + hops * 6
-    else:
-        mode = "F Layer"
-        hops = max(1, math.ceil(distance_km / 2500))
-        extra_loss_db = 12 + hops * 4
-    ground_wave_extra_loss_db = 10 + (distance_km / 50)
-    ground_wave_total_loss_db = fspl_db + ground_wave_extra_loss_db
-    skywave_base_total_loss_db = fspl_db + extra_loss_db
-    return {
-        'fspl': fspl_db,
-        'skywave_base_total_loss': skywave_base_total_loss_db,
-        'ground_wave_total_loss': ground_wave_total_loss_db,
-        'mode': mode,
-        'skywave_extra_loss': extra_loss_db,
-        'ground_wave_extra_loss': ground_wave_extra_loss_db
-    }
+# Precomputed at import for the link budget stage, which runs on every request
+NOISE_FLOORS = {name: calculate_noise_floor_dbm(name) for name in NOISE_FIGURES}
 
 def get_antenna_gain(type_name, height_name):
     """Looks up antenna gain based on type and height."""
@@ -290,183 +416,880 @@ def get_antenna_gain(type_name, height_name):
     height_adj = ANTENNA_PARAMS['height'].get(height_name, ANTENNA_PARAMS['height']['Medium (≈0.5λ)'])
     return type_params['base_gain_dbi'] + height_adj
 
-def calculate_snr(tx_power_w, total_path_loss_db, tx_gain_dbi, rx_gain_dbi, noise_floor_dbm):
-    """Calculate estimated SNR."""
-    fade_margin = 15
-    if not isfinite(total_path_loss_db) or tx_power_w <= 0:
-        return -float('inf')
-    tx_power_dbm = 10 * math.log10(tx_power_w * 1000)
-    received_power_dbm = tx_power_dbm + tx_gain_dbi + rx_gain_dbi - total_path_loss_db - fade_margin
-    snr_db = received_power_dbm - noise_floor_dbm
-    return snr_db
+# --- Path Geometry ---
+# Skywave paths are modelled as equal hops along the great circle. Each hop is
+# evaluated at its reflection (control) point, the hop midpoint: MUF, day/night
+# and absorption come from the sun and latitude there rather than from a single
+# lat/lon average. All helpers take arrays so a whole batch of paths, with all
+# of their hops, is computed at once.
+EARTH_RADIUS_KM = 6371
+F2_LAYER_HEIGHT_KM = 300
+E_LAYER_HEIGHT_KM = 110
+MIN_ELEVATION_DEG = 3 # Lowest useful take-off angle; sets the longest single hop
+
+def max_hop_distance_km(layer_height_km, min_elevation_deg=MIN_ELEVATION_DEG):
+    """Ground range of a single hop off a layer at the given height and elevation angle."""
+    elevation = math.radians(min_elevation_deg)
+    half_angle = math.pi / 2 - elevation - math.asin(
+        EARTH_RADIUS_KM * math.cos(elevation) / (EARTH_RADIUS_KM + layer_height_km))
+    return 2 * EARTH_RADIUS_KM * half_angle
+
+F2_MAX_HOP_KM = max_hop_distance_km(F2_LAYER_HEIGHT_KM) # ~3200 km
+E_MAX_HOP_KM = max_hop_distance_km(E_LAYER_HEIGHT_KM) # ~1800 km
+
+def calculate_distance_array(lat1, lon1, lat2, lon2):
+    """Great-circle distance (haversine) in km for arrays of paths."""
+    lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
+    lat2_rad, lon2_rad = np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2_rad - lat1_rad) / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin((lon2_rad - lon1_rad) / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+ANTIPODAL_TOLERANCE_RAD = 1e-6 # ~6 m short of the antipode
+
+def unit_vectors(lat, lon):
+    """(paths, 3) unit vectors (x, y, z) for arrays of points in degrees."""
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)], axis=1)
+
+def great_circle_points(lat1, lon1, lat2, lon2, distance_km, fractions):
+    """Points at the given fractions of the way along each great-circle path.
+
+    lat1..lon2 and distance_km have shape (paths,), fractions (paths, points);
+    returns (lat, lon) in degrees with the shape of fractions. Worked out with unit
+    vectors rather than bearings, which are undefined at the poles. Every great circle
+    through antipodal points is equally short, so (near-)antipodal paths are routed
+    due north from the transmitter, over the pole; one that starts at the North Pole
+    heads down the meridian opposite its longitude.
+    """
+    start, end = unit_vectors(lat1, lon1), unit_vectors(lat2, lon2)
+    lat1_rad, lon1_rad = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    north = np.concatenate([-np.sin(lat1_rad) * np.cos(lon1_rad), -np.sin(lat1_rad) * np.sin(lon1_rad),
+                            np.cos(lat1_rad)], axis=1)
+    # Direction of travel at the start: the part of the end point perpendicular to it
+    heading = end - np.sum(start * end, axis=1, keepdims=True) * start
+    path_angle = distance_km / EARTH_RADIUS_KM
+    undefined = (path_angle > math.pi - ANTIPODAL_TOLERANCE_RAD) | (path_angle < ANTIPODAL_TOLERANCE_RAD)
+    heading = np.where(undefined[:, None], north, heading)
+    heading /= np.linalg.norm(heading, axis=1, keepdims=True)
+    angle = (fractions * path_angle[:, None])[:, :, None]
+    x, y, z = np.moveaxis(np.cos(angle) * start[:, None, :] + np.sin(angle) * heading[:, None, :], 2, 0)
+    lat, lon = np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+    return lat, (lon + 540) % 360 - 180
+
+def get_hop_fractions(distance_km, max_hop_km):
+    """Splits each path into equal hops no longer than max_hop_km (one value per layer).
+
+    Returns (hops, fractions, valid): hop counts of shape (paths, layers), and
+    (paths, layers, max hops) arrays with each hop midpoint as a fraction of the path
+    length. Paths/layers with fewer hops are padded by repeating their last hop, which
+    leaves minimums unchanged; valid (1.0 for real hops, else 0.0) weights sums.
+    """
+    hops = np.maximum(1, np.ceil(distance_km[:, None] / max_hop_km))
+    hop_index = np.arange(hops.max())
+    fractions = (2 * np.minimum(hop_index, hops[:, :, None] - 1) + 1) / (2 * hops[:, :, None])
+    valid = (hop_index < hops[:, :, None]).astype(np.float64)
+    return hops.astype(np.int64), fractions, valid
+
+def get_solar_zenith_angle_array(lat, lon, dt_utc):
+    """Approximate solar zenith angle in degrees for arrays of points."""
+    day_of_year = dt_utc.timetuple().tm_yday
+    hour_utc = dt_utc.hour + dt_utc.minute / 60.0 + dt_utc.second / 3600.0
+    declination = -23.44 * math.cos(math.radians(360.0 / 365.25 * (day_of_year + 10)))
+    lat_rad = np.radians(lat)
+    decl_rad = math.radians(declination)
+    ha_rad = np.radians(15.0 * (hour_utc - 12.0) + lon)
+    cos_zenith = np.sin(lat_rad) * math.sin(decl_rad) + np.cos(lat_rad) * math.cos(decl_rad) * np.cos(ha_rad)
+    return np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
+
+def estimate_muf_array(zenith_angle, ssn):
+    """VERY simplified F2/E MUF estimate for arrays of control-point zenith angles; returns (f2_muf, e_muf).
+
+    FOTs are taken as 0.85 x MUF by the caller.
+    """
+    zenith_factor = np.sqrt(np.maximum(0, np.cos(np.radians(zenith_angle))))
+    f2_muf = np.clip((10 + (ssn * 0.1)) * (1 + 1.5 * zenith_factor), 5.0, 50.0)
+    e_muf = np.clip(5 + 10 * zenith_factor, 3.0, 25.0)
+    return f2_muf, e_muf
 
-def isfinite(f):
-    """Check if a float is finite (not inf or nan)."""
-    if f is None: return False
-    if hasattr(f, 'isinf') and hasattr(f, 'isnan'): return not (np.isinf(f) or np.isnan(f))
-    return not (math.isinf(f) or math.isnan(f))
+def calculate_absorption_terms(zenith_angle, lat, kp, sfi):
+    """Simplified D-layer and auroral absorption at arrays of control points, split into frequency-independent terms.
+
+    Returns (d_layer, auroral) with absorption(f) = d_layer / (f + 0.6)**1.8 + auroral / f**0.5,
+    so terms can be summed over hops before frequencies are applied.
+    """
+    cos_chi = np.maximum(0, np.cos(np.radians(zenith_angle)))
+    d_layer = np.where(zenith_angle < 95, (1 + 0.01 * sfi) * (15 * cos_chi**0.8), 0.0)
+    auroral_lat_threshold = 58
+    abs_lat = np.abs(lat)
+    lat_scale = 1 + (abs_lat - auroral_lat_threshold) / 15
+    auroral = np.where(abs_lat > auroral_lat_threshold, max(0, kp - 1)**1.8 * lat_scale * 3, 0.0)
+    return d_layer, auroral
+
+LAYER_MAX_HOP_KM = (F2_MAX_HOP_KM, E_MAX_HOP_KM) # Broadcast against per-path distances
+F2_LAYER, E_LAYER = 0, 1 # Layer axis of the per-hop arrays
+PATH_GEOMETRY_CACHE_SIZE = 1024
+
+def get_path_geometry(lat1, lon1, lat2, lon2):
+    """The time-independent geometry of each path: distance, hops per layer and control points.
+
+    Control points are laid out per path as [midpoint | F2 hops | E hops] so that everything
+    evaluated at them (zenith angle, MUF, absorption) is computed in one pass.
+    """
+    distance_km = calculate_distance_array(lat1, lon1, lat2, lon2)
+    hops, fractions, valid = get_hop_fractions(distance_km, LAYER_MAX_HOP_KM)
+    paths, layers, max_hops = fractions.shape
+    fractions = np.concatenate([np.full((paths, 1), 0.5), fractions.reshape(paths, layers * max_hops)], axis=1)
+    lat, lon = great_circle_points(lat1, lon1, lat2, lon2, distance_km, fractions)
+    return {'distance_km': distance_km, 'hops': hops, 'valid': valid, 'lat': lat, 'lon': lon}
+
+@functools.lru_cache(maxsize=PATH_GEOMETRY_CACHE_SIZE)
+def get_single_path_geometry(lat1, lon1, lat2, lon2):
+    """get_path_geometry for one path; cached since the UI re-requests the same paths."""
+    geometry = get_path_geometry(np.array([lat1]), np.array([lon1]), np.array([lat2]), np.array([lon2]))
+    for values in geometry.values():
+        values.flags.writeable = False # Shared between requests
+    return geometry
+
+def evaluate_control_points(geometry, dt_utc, ssn, kp, sfi):
+    """Evaluates the ionosphere at each path's midpoint and hop control points (see get_path_geometry).
+
+    Returns (midpoint_zenith, hops): hops maps to (paths, layers) arrays, indexed by F2_LAYER
+    and E_LAYER. Hops are combined per path: the path MUF is that of its most limiting hop, a
+    path is daylit only if every reflection point is, and absorption adds up over hops.
+    """
+    valid = geometry['valid']
+    paths, layers, max_hops = valid.shape
+    lat = geometry['lat']
+    zenith_angle = get_solar_zenith_angle_array(lat, geometry['lon'], dt_utc)
+    f2_muf, e_muf = estimate_muf_array(zenith_angle[:, 1:], ssn)
+    d_layer, auroral = calculate_absorption_terms(zenith_angle[:, 1:], lat[:, 1:], kp, sfi)
+
+    def per_hop(values):
+        return values.reshape(paths, layers, max_hops)
+    return zenith_angle[:, 0], {
+        'hops': geometry['hops'],
+        'f2_muf': per_hop(f2_muf).min(axis=2),
+        'e_muf': per_hop(e_muf).min(axis=2),
+        'daylit': per_hop(zenith_angle[:, 1:] < 90).all(axis=2),
+        'd_layer': (per_hop(d_layer) * valid).sum(axis=2),
+        'auroral': (per_hop(auroral) * valid).sum(axis=2),
+    }
 
 # --- Main Simulation Logic ---
-# run_hf_simulation remains the same as the previous version.
-def run_hf_simulation(params):
-    """Performs the HF simulation for a range of frequencies."""
-    results = []
-    real_time_indices = get_latest_indices()
+# The simulation is split into two stages so the UI can tweak link-budget
+# inputs (power, antennas, noise) without re-running the propagation model:
+#   run_propagation_stage - distance, hops, zenith, MUF, absorption, path loss (slow-changing)
+#   run_link_budget_stage - gains, noise floor, SNR and likelihood (cheap)
+# Per-frequency values are kept in NumPy structured arrays (PROPAGATION_DTYPE,
+# LINK_BUDGET_DTYPE) and values shared by every row are stored once; rows are
+# only materialized when serialized (serialize_results) or converted (results_to_dicts).
+def run_propagation_stage(params, real_time_indices=None):
+    """Computes the geometry/ionosphere part of the simulation for each frequency step.
+
+    real_time_indices may be passed in by callers that fetched them already (e.g. the ASGI app).
+    """
+    return run_propagation_stages([params], real_time_indices)[0]
+
+def run_propagation_stages(params_list, real_time_indices=None):
+    """run_propagation_stage for several paths at once (batched /simulate requests).
+
+    Paths, hops and frequency steps are all evaluated as arrays; the per-frequency rows of all
+    paths are computed together and split into one stage per path at the end.
+    """
+    if real_time_indices is None:
+        real_time_indices = get_latest_indices()
     sfi = real_time_indices['sfi']
     ssn = real_time_indices['ssn'] # Using default/fallback SSN
     kp = real_time_indices['kp']
 
-    lat1, lon1 = params['txLat'], params['txLon']
-    lat2, lon2 = params['rxLat'], params['rxLon']
-    tx_power_w = params['txPowerW']
-    start_freq = params['startFreq']
-    end_freq = params['endFreq']
-    steps = params['freqSteps']
-    tx_antenna_type = params['txAntennaType']
-    tx_antenna_height = params['txAntennaHeight']
-    rx_antenna_type = params['rxAntennaType']
-    rx_antenna_height = params['rxAntennaHeight']
-    noise_environment = params['noiseEnvironment']
-
-    distance_km = calculate_distance(lat1, lon1, lat2, lon2)
-    lon_diff = lon2 - lon1
-    if lon_diff > 180: mid_lon = (lon1 + lon2 - 360) / 2
-    elif lon_diff < -180: mid_lon = (lon1 + lon2 + 360) / 2
-    else: mid_lon = (lon1 + lon2) / 2
-    if mid_lon > 180: mid_lon -= 360
-    if mid_lon < -180: mid_lon += 360
-    mid_lat = (lat1 + lat2) / 2
+    lat1 = np.array([params['txLat'] for params in params_list], dtype=np.float64)
+    lon1 = np.array([params['txLon'] for params in params_list], dtype=np.float64)
+    lat2 = np.array([params['rxLat'] for params in params_list], dtype=np.float64)
+    lon2 = np.array([params['rxLon'] for params in params_list], dtype=np.float64)
+    start_freq = np.array([params['startFreq'] for params in params_list], dtype=np.float64)
+    end_freq = np.array([params['endFreq'] for params in params_list], dtype=np.float64)
+    steps = np.array([params['freqSteps'] for params in params_list], dtype=np.int64)
 
+    if len(params_list) == 1:
+        geometry = get_single_path_geometry(lat1[0].item(), lon1[0].item(), lat2[0].item(), lon2[0].item())
+    else:
+        geometry = get_path_geometry(lat1, lon1, lat2, lon2)
+    distance_km = geometry['distance_km']
     dt_utc = datetime.datetime.now(datetime.timezone.utc)
-    zenith_angle = get_solar_zenith_angle(mid_lat, mid_lon, dt_utc)
-    is_day = zenith_angle < 90
-    time_of_day_str = "Day" if is_day else "Night"
+    # The great-circle midpoint gives the reported zenith angle and time of day
+    zenith_angle, hops = evaluate_control_points(geometry, dt_utc, ssn, kp, sfi)
+    f2_muf = hops['f2_muf'][:, F2_LAYER]
+    e_muf = hops['e_muf'][:, E_LAYER]
 
-    muf_data = estimate_muf_fot(lat1, lon1, lat2, lon2, dt_utc, ssn)
-    noise_floor_info = calculate_noise_floor_dbm(noise_environment)
-    noise_floor_dbm = noise_floor_info['noiseFloorDbm']
-    noise_figure_db = noise_floor_info['noiseFigureDb']
-    tx_gain_dbi = get_antenna_gain(tx_antenna_type, tx_antenna_height)
-    rx_gain_dbi = get_antenna_gain(rx_antenna_type, rx_antenna_height)
-
-    freq_increment = (end_freq - start_freq) / (steps - 1) if steps > 1 else 0
-
-    for i in range(steps):
-        freq_mhz = start_freq + i * freq_increment if steps > 1 else start_freq
-        freq_mhz = max(1.8, min(30.0, freq_mhz))
-
-        absorption_db = calculate_absorption(freq_mhz, zenith_angle, kp, mid_lat, sfi)
-        path_loss_info = calculate_path_loss(distance_km, freq_mhz, muf_data, is_day, zenith_angle)
-
-        skywave_total_loss_with_abs = path_loss_info['skywave_base_total_loss'] + absorption_db
-        ground_wave_total_loss = path_loss_info['ground_wave_total_loss']
-
-        skywave_snr = calculate_snr(tx_power_w, skywave_total_loss_with_abs, tx_gain_dbi, rx_gain_dbi, noise_floor_dbm)
-        ground_wave_snr = calculate_snr(tx_power_w, ground_wave_total_loss, tx_gain_dbi, rx_gain_dbi, noise_floor_dbm)
-
-        likelihood = "Poor"
-        if freq_mhz <= muf_data['f2_muf'] and absorption_db < 30:
-            if freq_mhz <= muf_data['f2_fot'] and skywave_snr > 5: likelihood = "Good"
-            elif skywave_snr > -5: likelihood = "Fair"
-        elif likelihood == "Poor" and ground_wave_snr > 0:
-             likelihood = "Fair (GW?)"
-
-        results.append({
-            "frequencyMHz": freq_mhz, "distanceKm": distance_km, "txPowerW": tx_power_w,
-            "timeOfDay": time_of_day_str, "txAntennaType": tx_antenna_type, "txAntennaHeight": tx_antenna_height,
-            "rxAntennaType": rx_antenna_type, "rxAntennaHeight": rx_antenna_height,
-            "noiseEnvironment": noise_environment, "txGainDbi": tx_gain_dbi, "rxGainDbi": rx_gain_dbi,
-            "noiseFloorDbm": noise_floor_dbm, "noiseFigureDb": noise_figure_db,
-            "fsplDb": path_loss_info['fspl'],
-            "groundWaveExtraLossDb": path_loss_info['ground_wave_extra_loss'],
-            "groundWaveTotalLossDb": ground_wave_total_loss, "groundWaveSNR": ground_wave_snr,
-            "skywaveMode": path_loss_info['mode'],
-            "skywaveExtraLossDb": path_loss_info['skywave_extra_loss'],
-            "absorptionDb": absorption_db, "skywaveTotalLossDb": skywave_total_loss_with_abs,
-            "skywaveSNR": skywave_snr, "skywaveLikelihood": likelihood,
-            "MUF_F2": muf_data['f2_muf'], "FOT_F2": muf_data['f2_fot'], "MUF_E": muf_data['e_muf'],
-            "solarZenithAngle": zenith_angle, "sfi": sfi, "ssn": ssn, "kp": kp
+    # One row per (path, frequency step); a single path's values broadcast without indexing
+    if len(params_list) == 1:
+        step_index = np.arange(steps[0])
+        per_row = lambda values: values
+    else:
+        path_index = np.repeat(np.arange(len(params_list)), steps)
+        step_index = np.arange(len(path_index)) - np.repeat(np.cumsum(steps) - steps, steps)
+        per_row = lambda values: values[path_index]
+    freq_increment = np.where(steps > 1, (end_freq - start_freq) / np.maximum(steps - 1, 1), 0)
+    frequencies_mhz = np.minimum(30.0, np.maximum(1.8, per_row(start_freq) + step_index * per_row(freq_increment)))
+
+    fspl_db = per_row(20 * np.log10(np.maximum(1.0, distance_km * 1000))) + 20 * np.log10(frequencies_mhz * 1e6) - 147.55
+    above_muf = frequencies_mhz > per_row(f2_muf)
+    e_mode = ~above_muf & per_row(hops['daylit'][:, E_LAYER]) & (frequencies_mhz <= per_row(e_muf))
+    f_hops, e_hops = hops['hops'][:, F2_LAYER], hops['hops'][:, E_LAYER]
+    skywave_extra_loss_db = np.where(above_muf, 100, np.where(e_mode, per_row(18 + e_hops * 6), per_row(12 + f_hops * 4)))
+    mode_codes = np.where(above_muf, MODE_ABOVE_F2_MUF, np.where(e_mode, MODE_E_LAYER, MODE_F_LAYER))
+    # Non-finite FSPL (not reachable with validated inputs) is reported as mode 'N/A' with no extra loss
+    finite = np.isfinite(fspl_db)
+    skywave_extra_loss_db = np.where(finite, skywave_extra_loss_db, 0)
+    mode_codes = np.where(finite, mode_codes, MODE_NA)
+
+    # Absorption is summed over the hops of the layer each frequency propagates by
+    d_layer = np.where(e_mode, per_row(hops['d_layer'][:, E_LAYER]), per_row(hops['d_layer'][:, F2_LAYER]))
+    auroral = np.where(e_mode, per_row(hops['auroral'][:, E_LAYER]), per_row(hops['auroral'][:, F2_LAYER]))
+    absorption_db = d_layer / (frequencies_mhz + 0.6)**1.8 + auroral / frequencies_mhz**0.5
+
+    ground_wave_extra_loss_db = 10 + (distance_km / 50)
+    columns = np.empty(len(frequencies_mhz), dtype=PROPAGATION_DTYPE)
+    columns['frequency_mhz'] = frequencies_mhz
+    columns['absorption_db'] = absorption_db
+    columns['fspl_db'] = fspl_db
+    columns['skywave_extra_loss_db'] = skywave_extra_loss_db
+    columns['skywave_total_loss_db'] = (fspl_db + skywave_extra_loss_db) + absorption_db
+    columns['ground_wave_total_loss_db'] = fspl_db + per_row(ground_wave_extra_loss_db)
+    columns['mode'] = mode_codes
+
+    stages = []
+    row_start = 0
+    for i, path_steps in enumerate(steps.tolist()):
+        path_columns = columns[row_start:row_start + path_steps]
+        row_start += path_steps
+        stages.append({
+            'distance_km': distance_km[i].item(),
+            'zenith_angle': zenith_angle[i].item(),
+            'time_of_day': "Day" if zenith_angle[i] < 90 else "Night",
+            'muf_data': {
+                'f2_muf': f2_muf[i].item(), 'f2_fot': f2_muf[i].item() * 0.85,
+                'e_muf': e_muf[i].item(), 'e_fot': e_muf[i].item() * 0.85
+            },
+            'ground_wave_extra_loss_db': ground_wave_extra_loss_db[i].item(),
+            'sfi': sfi, 'ssn': ssn, 'kp': kp,
+            'columns': path_columns
         })
-    return results
+    return stages
+
+def calculate_snr_array(tx_power_w, total_path_loss_db, tx_gain_dbi, rx_gain_dbi, noise_floor_dbm):
+    """Calculate estimated SNR for an array of path losses."""
+    fade_margin = 15
+    if tx_power_w <= 0:
+        return np.full(len(total_path_loss_db), -np.inf)
+    tx_power_dbm = 10 * math.log10(tx_power_w * 1000)
+    received_power_dbm = tx_power_dbm + tx_gain_dbi + rx_gain_dbi - total_path_loss_db - fade_margin
+    snr_db = received_power_dbm - noise_floor_dbm
+    return np.where(np.isfinite(total_path_loss_db), snr_db, -np.inf)
+
+def run_link_budget_stage(stage, params):
+    """Applies power, antenna and noise settings to a propagation stage."""
+    noise_environment = params['noiseEnvironment']
+    noise_floor_info = NOISE_FLOORS.get(noise_environment) or calculate_noise_floor_dbm(noise_environment)
+    noise_floor_dbm = noise_floor_info['noiseFloorDbm']
+    tx_gain_dbi = get_antenna_gain(params['txAntennaType'], params['txAntennaHeight'])
+    rx_gain_dbi = get_antenna_gain(params['rxAntennaType'], params['rxAntennaHeight'])
+    tx_power_w = params['txPowerW']
+
+    propagation = stage['columns']
+    muf_data = stage['muf_data']
+    freq_mhz = propagation['frequency_mhz']
+    skywave_snr = calculate_snr_array(tx_power_w, propagation['skywave_total_loss_db'], tx_gain_dbi, rx_gain_dbi, noise_floor_dbm)
+    ground_wave_snr = calculate_snr_array(tx_power_w, propagation['ground_wave_total_loss_db'], tx_gain_dbi, rx_gain_dbi, noise_floor_dbm)
+
+    skywave_possible = (freq_mhz <= muf_data['f2_muf']) & (propagation['absorption_db'] < 30)
+    good = skywave_possible & (freq_mhz <= muf_data['f2_fot']) & (skywave_snr > 5)
+    fair = skywave_possible & ~good & (skywave_snr > -5)
+    fair_ground_wave = ~skywave_possible & (ground_wave_snr > 0)
+
+    columns = np.empty(len(propagation), dtype=LINK_BUDGET_DTYPE)
+    columns['skywave_snr'] = skywave_snr
+    columns['ground_wave_snr'] = ground_wave_snr
+    columns['likelihood'] = np.select([good, fair, fair_ground_wave],
+                                      [LIKELIHOOD_GOOD, LIKELIHOOD_FAIR, LIKELIHOOD_FAIR_GW], LIKELIHOOD_POOR)
+
+    return {
+        'tx_power_w': tx_power_w,
+        'tx_antenna_type': params['txAntennaType'], 'tx_antenna_height': params['txAntennaHeight'],
+        'rx_antenna_type': params['rxAntennaType'], 'rx_antenna_height': params['rxAntennaHeight'],
+        'noise_environment': noise_environment,
+        'tx_gain_dbi': tx_gain_dbi, 'rx_gain_dbi': rx_gain_dbi,
+        'noise_floor_dbm': noise_floor_dbm, 'noise_figure_db': noise_floor_info['noiseFigureDb'],
+        'columns': columns
+    }
+
+def run_hf_simulation(params):
+    """Performs the HF simulation for a range of frequencies, returning one dict per frequency."""
+    stage = run_propagation_stage(params)
+    return results_to_dicts(stage, run_link_budget_stage(stage, params))
+
+
+# --- Result Serialization ---
+def get_result_fields(stage, link_budget):
+    """Maps every result key to either ('value', shared_value) or ('column', per-row values)."""
+    propagation = stage['columns']
+    budget = link_budget['columns']
+    muf_data = stage['muf_data']
+    return {
+        "frequencyMHz": ('column', propagation['frequency_mhz']),
+        "distanceKm": ('value', stage['distance_km']), "txPowerW": ('value', link_budget['tx_power_w']),
+        "timeOfDay": ('value', stage['time_of_day']),
+        "txAntennaType": ('value', link_budget['tx_antenna_type']), "txAntennaHeight": ('value', link_budget['tx_antenna_height']),
+        "rxAntennaType": ('value', link_budget['rx_antenna_type']), "rxAntennaHeight": ('value', link_budget['rx_antenna_height']),
+        "noiseEnvironment": ('value', link_budget['noise_environment']),
+        "txGainDbi": ('value', link_budget['tx_gain_dbi']), "rxGainDbi": ('value', link_budget['rx_gain_dbi']),
+        "noiseFloorDbm": ('value', link_budget['noise_floor_dbm']), "noiseFigureDb": ('value', link_budget['noise_figure_db']),
+        "fsplDb": ('column', propagation['fspl_db']),
+        "groundWaveExtraLossDb": ('value', stage['ground_wave_extra_loss_db']),
+        "groundWaveTotalLossDb": ('column', propagation['ground_wave_total_loss_db']),
+        "groundWaveSNR": ('column', budget['ground_wave_snr']),
+        "skywaveMode": ('column', propagation['mode']),
+        "skywaveExtraLossDb": ('column', propagation['skywave_extra_loss_db']),
+        "absorptionDb": ('column', propagation['absorption_db']),
+        "skywaveTotalLossDb": ('column', propagation['skywave_total_loss_db']),
+        "skywaveSNR": ('column', budget['skywave_snr']), "skywaveLikelihood": ('column', budget['likelihood']),
+        "MUF_F2": ('value', muf_data['f2_muf']), "FOT_F2": ('value', muf_data['f2_fot']), "MUF_E": ('value', muf_data['e_muf']),
+        "solarZenithAngle": ('value', stage['zenith_angle']),
+        "sfi": ('value', stage['sfi']), "ssn": ('value', stage['ssn']), "kp": ('value', stage['kp'])
+    }
+
+# Enum columns are decoded through these tables
+ENUM_COLUMN_NAMES = {'skywaveMode': MODE_NAMES, 'skywaveLikelihood': LIKELIHOOD_NAMES}
+ENUM_COLUMN_JSON = {key: [json.dumps(name) for name in names] for key, names in ENUM_COLUMN_NAMES.items()}
+
+def format_json_numbers(values):
+    """Formats numbers exactly like json.dumps does (including Infinity/-Infinity/NaN)."""
+    return [repr(value) if math.isfinite(value) else
+            ('NaN' if value != value else ('Infinity' if value > 0 else '-Infinity'))
+            for value in values]
+
+def serialize_results(stage, link_budget):
+    """Serializes results straight from the column arrays.
+
+    Produces the same JSON as jsonify(run_hf_simulation(...)) without building row dicts:
+    shared values are encoded once into a per-row template and only column values are
+    formatted per row.
+    """
+    template_parts = []
+    column_strings = []
+    for key, (kind, value) in sorted(get_result_fields(stage, link_budget).items()):
+        if kind == 'value':
+            template_parts.append(json.dumps(key) + ':' + json.dumps(value).replace('%', '%%'))
+            continue
+        template_parts.append(json.dumps(key) + ':%s')
+        if key in ENUM_COLUMN_JSON:
+            encoded = ENUM_COLUMN_JSON[key]
+            column_strings.append([encoded[code] for code in value.tolist()])
+        elif key == 'absorptionDb':
+            # "No absorption" has always been reported as the integer 0
+            column_strings.append(['0' if v == 0 else s for v, s in zip(value.tolist(), format_json_numbers(value.tolist()))])
+        else:
+            column_strings.append(format_json_numbers(value.tolist()))
+    row_template = '{' + ','.join(template_parts) + '}'
+    return '[' + ','.join(row_template % row for row in zip(*column_strings)) + ']'
+
+def results_to_dicts(stage, link_budget):
+    """Materializes results as one dict per frequency (the original run_hf_simulation format)."""
+    fields = get_result_fields(stage, link_budget)
+    columns = {}
+    for key, (kind, value) in fields.items():
+        if kind == 'column':
+            values = value.tolist()
+            if key in ENUM_COLUMN_NAMES:
+                values = [ENUM_COLUMN_NAMES[key][code] for code in values]
+            elif key == 'absorptionDb':
+                values = [0 if v == 0 else v for v in values]
+            columns[key] = values
+    rows = []
+    for i in range(len(stage['columns'])):
+        rows.append({key: (columns[key][i] if kind == 'column' else value) for key, (kind, value) in fields.items()})
+    return rows
+
+
+# --- Propagation Stage Cache ---
+def store_propagation_stage(stage):
+    """Caches a propagation stage and returns the result id used to re-apply link budgets to it."""
+    global simulation_cache_bytes
+    now = time.time()
+    result_id = uuid.uuid4().hex
+    size = stage['columns'].nbytes + SIMULATION_CACHE_ENTRY_OVERHEAD_BYTES
+    with SIMULATION_CACHE_LOCK:
+        # Least recently used first: drop expired entries, then as many more as the new one needs
+        while SIMULATION_CACHE:
+            oldest_entry = next(iter(SIMULATION_CACHE.values()))
+            if (now - oldest_entry['timestamp'] < SIMULATION_CACHE_DURATION_SECONDS
+                    and simulation_cache_bytes + size <= SIMULATION_CACHE_MAX_BYTES):
+                break
+            simulation_cache_bytes -= SIMULATION_CACHE.popitem(last=False)[1]['size']
+        SIMULATION_CACHE[result_id] = {'stage': stage, 'timestamp': now, 'size': size}
+        simulation_cache_bytes += size
+    return result_id
+
+def get_propagation_stage(result_id):
+    """Returns a cached propagation stage, or None if unknown or expired. Each use extends its life."""
+    now = time.time()
+    with SIMULATION_CACHE_LOCK:
+        cache_entry = SIMULATION_CACHE.get(result_id)
+        if not cache_entry or now - cache_entry['timestamp'] >= SIMULATION_CACHE_DURATION_SECONDS:
+            return None
+        cache_entry['timestamp'] = now
+        SIMULATION_CACHE.move_to_end(result_id)
+        return cache_entry['stage']
+
+
+# --- Input Validation ---
+# Shared by the Flask routes below and the ASGI app (asgi.py). The checks are
+# declared in param_schema.py and compiled once here.
+SIMULATION_SCHEMA = param_schema.compile_schema(param_schema.simulation_checks(
+    MAX_TX_POWER, MAX_FREQ_STEPS, ALLOWED_ANTENNA_TYPES, ALLOWED_ANTENNA_HEIGHTS, ALLOWED_NOISE_ENV))
+LINK_BUDGET_SCHEMA = param_schema.compile_schema(param_schema.link_budget_checks(
+    MAX_TX_POWER, ALLOWED_ANTENNA_TYPES, ALLOWED_ANTENNA_HEIGHTS, ALLOWED_NOISE_ENV))
+
+def validate_simulation_params(params):
+    """Validates a /simulate payload. Returns the validated params or raises ValueError with a user-facing message."""
+    return SIMULATION_SCHEMA.validate(params)
+
+def validate_link_budget_params(params):
+    """Validates a /simulate/update payload (resultId plus link-budget inputs). Raises ValueError on bad input."""
+    return LINK_BUDGET_SCHEMA.validate(params)
+
+def validate_simulation_batch(payloads):
+    """Validates a list of /simulate payloads; bad items are returned as errors by index."""
+    return param_schema.validate_simulation_batch(SIMULATION_SCHEMA, payloads, MAX_BATCH_ITEMS, MAX_BATCH_FREQ_STEPS)
+
+def run_simulation_batch(validated, real_time_indices=None):
+    """Runs the propagation stage of every valid batch item; returns [(index, params, stage)].
+
+    Batch results are not stored for /simulate/update, so they do not evict interactive ones.
+    """
+    indexed_params = [(index, params) for index, params in enumerate(validated) if params is not None]
+    stages = run_propagation_stages([params for _, params in indexed_params], real_time_indices) if indexed_params else []
+    return [(index, params, stage) for (index, params), stage in zip(indexed_params, stages)]
+
+def iter_simulation_batch_json(errors, batch):
+    """Yields the body {"errors": [...], "results": [{"index": i, "results": [...]}]} one item at a time.
+
+    batch comes from run_simulation_batch. Each item's link budget is applied and serialized
+    only when it is reached, so a streamed response holds one item's text at a time rather
+    than the whole body (and its joined copy). The body ends with jsonify's newline.
+    """
+    yield '{"errors":%s,"results":[' % json.dumps(errors, sort_keys=True, separators=(',', ':'))
+    for position, (index, params, stage) in enumerate(batch):
+        results = serialize_results(stage, run_link_budget_stage(stage, params))
+        yield '%s{"index":%d,"results":%s}' % (',' if position else '', index, results)
+    yield ']}\n'
+
+def serialize_simulation_batch(validated, errors, real_time_indices=None):
+    """Runs every valid batch item and returns the JSON body as an iterator of text chunks.
+
+    The simulation runs here, so its errors are raised to the caller; only serialization is
+    left to the iterator (see iter_simulation_batch_json).
+    """
+    return iter_simulation_batch_json(errors, run_simulation_batch(validated, real_time_indices))
+
+
+# --- Popular Path Precompute ---
+# Popularity is tracked per path key: tx/rx coordinates rounded to
+# PRECOMPUTE_COORD_STEP_DEG plus the exact frequency range. The key only ranks
+# paths: the precompute thread computes each top path at the exact coordinates
+# of its most recent request, on startup, whenever space weather changes and
+# every PRECOMPUTE_INTERVAL_SECONDS, and /simulate serves a warm stage only to
+# requests with exactly those coordinates. A warm hit skips the propagation stage,
+# about 0.2-0.4 ms of the ~1.4 ms a /simulate costs, and in asgi.py the trip through
+# the simulation executor too, which is close to half the request with a process pool.
+PATH_PARAM_KEYS = ('txLat', 'txLon', 'rxLat', 'rxLon', 'startFreq', 'endFreq', 'freqSteps')
+PATH_SCHEMA = param_schema.compile_schema([
+    check for check in param_schema.simulation_checks(
+        MAX_TX_POWER, MAX_FREQ_STEPS, ALLOWED_ANTENNA_TYPES, ALLOWED_ANTENNA_HEIGHTS, ALLOWED_NOISE_ENV)
+    if check['kind'] == 'rule' or check['name'] in PATH_PARAM_KEYS])
+PATH_POPULARITY = {} # path key -> decayed request count
+PATH_LATEST_PARAMS = {} # path key -> path params (PATH_PARAM_KEYS) of its most recent request
+PATH_POPULARITY_LOCK = threading.Lock()
+WARM_CACHE = {} # path key -> {'stage', 'params', 'indices', 'timestamp'}
+PRECOMPUTE_WAKE_EVENT = threading.Event()
+
+def get_path_key(params):
+    """Groups requests for (nearly) the same path and frequency range."""
+    step = PRECOMPUTE_COORD_STEP_DEG
+    return (round(params['txLat'] / step), round(params['txLon'] / step),
+            round(params['rxLat'] / step), round(params['rxLon'] / step),
+            params['startFreq'], params['endFreq'], params['freqSteps'])
+
+def get_path_params(params):
+    """The exact path params (PATH_PARAM_KEYS) of a request."""
+    return {key: params[key] for key in PATH_PARAM_KEYS}
+
+def record_path_request(params):
+    """Counts a /simulate request towards its path's popularity."""
+    if not PRECOMPUTE_ENABLED:
+        return
+    path_key = get_path_key(params)
+    with PATH_POPULARITY_LOCK:
+        if path_key not in PATH_POPULARITY and len(PATH_POPULARITY) >= MAX_TRACKED_PATHS:
+            evict_least_popular_paths()
+        PATH_POPULARITY[path_key] = PATH_POPULARITY.get(path_key, 0) + 1
+        PATH_LATEST_PARAMS[path_key] = get_path_params(params)
+
+def evict_least_popular_paths():
+    """Forgets the lowest-scored PATH_EVICTION_FRACTION of tracked paths (oldest first on ties).
+
+    Called with PATH_POPULARITY_LOCK held when a new path needs room. Evicting a batch at
+    a time keeps a burst of one-off paths from costing a full scan per request.
+    """
+    evict_count = max(1, int(len(PATH_POPULARITY) * PATH_EVICTION_FRACTION))
+    # nsmallest is stable and dicts keep insertion order: on ties the paths tracked longest go first
+    for path_key, _ in heapq.nsmallest(evict_count, PATH_POPULARITY.items(), key=lambda item: item[1]):
+        del PATH_POPULARITY[path_key]
+        del PATH_LATEST_PARAMS[path_key]
+
+def get_warm_stage(params, real_time_indices):
+    """Returns the precomputed propagation stage for params' path, or None if not warm.
+
+    Stages are only served for exactly the path they were computed for, while they were
+    computed with the current indices and are younger than WARM_CACHE_MAX_AGE_SECONDS.
+    """
+    cache_entry = WARM_CACHE.get(get_path_key(params))
+    if (cache_entry is None or cache_entry['indices'] != real_time_indices
+            or time.time() - cache_entry['timestamp'] >= WARM_CACHE_MAX_AGE_SECONDS
+            or any(cache_entry['params'][key] != params[key] for key in PATH_PARAM_KEYS)):
+        return None
+    return cache_entry['stage']
+
+def get_popular_paths(elapsed_seconds):
+    """Returns the top PRECOMPUTE_TOP_PATHS (path key, score, path params), then ages all scores by elapsed_seconds."""
+    decay = 0.5 ** (elapsed_seconds / PATH_SCORE_HALF_LIFE_SECONDS)
+    with PATH_POPULARITY_LOCK:
+        popular_paths = [(path_key, score, PATH_LATEST_PARAMS[path_key]) for path_key, score in
+                         heapq.nlargest(PRECOMPUTE_TOP_PATHS, PATH_POPULARITY.items(), key=lambda item: item[1])]
+        for path_key, score in list(PATH_POPULARITY.items()):
+            if score * decay < MIN_PATH_SCORE:
+                del PATH_POPULARITY[path_key]
+                del PATH_LATEST_PARAMS[path_key]
+            else:
+                PATH_POPULARITY[path_key] = score * decay
+    return popular_paths
+
+def read_popular_paths(now):
+    """Reads the persisted popular path list as (path key, score, path params), scores aged to now.
+
+    Invalid entries and paths whose aged score fell below MIN_PATH_SCORE are skipped.
+    """
+    if not POPULAR_PATHS_FILE or not os.path.exists(POPULAR_PATHS_FILE):
+        return []
+    try:
+        with open(POPULAR_PATHS_FILE, encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            raise ValueError("expected a list of paths")
+    except (OSError, ValueError) as e:
+        print(f"Error loading popular paths from {POPULAR_PATHS_FILE}: {e}")
+        return []
+    validated, _ = PATH_SCHEMA.validate_many(entries)
+    popular_paths = []
+    for entry, params in zip(entries, validated):
+        if params is None:
+            continue
+        score = entry.get('score')
+        score = score if isinstance(score, (int, float)) and score > 0 else 1
+        saved_at = entry.get('savedAt')
+        if isinstance(saved_at, (int, float)) and saved_at < now:
+            score *= 0.5 ** ((now - saved_at) / PATH_SCORE_HALF_LIFE_SECONDS)
+        if score >= MIN_PATH_SCORE:
+            popular_paths.append((get_path_key(params), score, get_path_params(params)))
+    return popular_paths
+
+def save_popular_paths(popular_paths):
+    """Merges this process's popular paths into the persisted list, so a restarted worker can warm up before traffic arrives.
+
+    Every process saves its own view: each server worker, and a --preload master that sees
+    no traffic at all. So the file is read, merged and rewritten under an exclusive lock,
+    each path keeping the higher of the saved score (aged since it was saved) and this
+    process's. Taking the higher rather than the sum keeps repeated saves from inflating
+    scores; with traffic spread evenly over N workers, scores are about 1/N of the
+    deployment's but rank the same.
+    """
+    if not POPULAR_PATHS_FILE:
+        return
+    try:
+        os.makedirs(os.path.dirname(POPULAR_PATHS_FILE), exist_ok=True)
+        with open(f"{POPULAR_PATHS_FILE}.lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+            now = time.time()
+            merged = {path_key: (score, path_params) for path_key, score, path_params in read_popular_paths(now)}
+            for path_key, score, path_params in popular_paths:
+                if path_key not in merged or score > merged[path_key][0]:
+                    merged[path_key] = (score, path_params)
+            top_paths = heapq.nlargest(PRECOMPUTE_TOP_PATHS, merged.values(), key=lambda item: item[0])
+            entries = [dict(path_params, score=score, savedAt=now) for score, path_params in top_paths]
+            temp_file = f"{POPULAR_PATHS_FILE}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=1)
+            os.replace(temp_file, POPULAR_PATHS_FILE) # Atomic, so readers never see a partial file
+    except OSError as e:
+        print(f"Error saving popular paths to {POPULAR_PATHS_FILE}: {e}")
+
+def load_popular_paths():
+    """Seeds path popularity from the persisted list."""
+    popular_paths = read_popular_paths(time.time())
+    with PATH_POPULARITY_LOCK:
+        for path_key, score, path_params in popular_paths:
+            if path_key not in PATH_POPULARITY and len(PATH_POPULARITY) < MAX_TRACKED_PATHS:
+                PATH_POPULARITY[path_key] = score
+                PATH_LATEST_PARAMS[path_key] = path_params
+
+def precompute_paths(popular_paths, real_time_indices):
+    """Computes and publishes warm stages for popular_paths (see get_popular_paths), most popular first.
+
+    Work is done in small batches with pauses in between so the thread uses at most
+    PRECOMPUTE_MAX_CPU_FRACTION of a core (and holds the GIL only briefly at a time).
+    """
+    for chunk_start in range(0, len(popular_paths), PRECOMPUTE_CHUNK_PATHS):
+        chunk = popular_paths[chunk_start:chunk_start + PRECOMPUTE_CHUNK_PATHS]
+        started = time.perf_counter()
+        stages = run_propagation_stages([path_params for _, _, path_params in chunk], real_time_indices)
+        now = time.time()
+        for (path_key, _, path_params), stage in zip(chunk, stages):
+            WARM_CACHE[path_key] = {'stage': stage, 'params': path_params, 'indices': real_time_indices, 'timestamp': now}
+        elapsed = time.perf_counter() - started
+        time.sleep(elapsed * (1 / PRECOMPUTE_MAX_CPU_FRACTION - 1))
+    # Paths that dropped out of the top list are no longer kept warm
+    for path_key in set(WARM_CACHE) - {path_key for path_key, _, _ in popular_paths}:
+        WARM_CACHE.pop(path_key, None)
+
+def run_precompute_scheduler(fetch_indices):
+    """Background loop: refresh space weather, then re-warm the most requested paths."""
+    load_popular_paths()
+    last_run = time.time()
+    while True:
+        try:
+            PRECOMPUTE_WAKE_EVENT.clear() # Before fetching, so a refresh that ends meanwhile wakes the next round
+            real_time_indices = fetch_indices() # Also keeps the NOAA cache warm
+            now = time.time()
+            popular_paths = get_popular_paths(now - last_run)
+            last_run = now
+            precompute_paths(popular_paths, real_time_indices)
+            save_popular_paths(popular_paths)
+        except Exception as e:
+            print(f"Error precomputing popular paths: {e}")
+            traceback.print_exc()
+        PRECOMPUTE_WAKE_EVENT.wait(PRECOMPUTE_INTERVAL_SECONDS)
+
+
+
+# --- Startup ---
+# Importing this module does no I/O and loads none of Flask, requests or NumPy. A
+# background thread started with the server warms up instead: it fetches the SWPC
+# indices and runs one small simulation, which imports NumPy and pays its first-call
+# costs, then goes on to precompute popular paths (if enabled). /ready reports when
+# the warm-up is done, for load balancer and autoscaler readiness probes.
+WARM_UP_PARAMS = {
+    'txLat': 35.17, 'txLon': -79.41, 'rxLat': 40.71, 'rxLon': -74.00, # The UI's default path
+    'txPowerW': 100, 'startFreq': 1.8, 'endFreq': 30.0, 'freqSteps': MAX_FREQ_STEPS,
+    'txAntennaType': 'Dipole', 'txAntennaHeight': 'Medium (≈0.5λ)',
+    'rxAntennaType': 'Dipole', 'rxAntennaHeight': 'Medium (≈0.5λ)',
+    'noiseEnvironment': 'Residential',
+}
+WARM_UP_INDICES = {'sfi': 80, 'ssn': 10, 'kp': 2, 'ap': 7} # parse_latest_indices' defaults
+WARM_UP_DONE = threading.Event()
+WARM_UP_IMPORTS_DONE = threading.Event() # Set as soon as the warm-up has imported NumPy and requests
+background_tasks_pid = None # Process that started the background thread
+background_tasks_lock = threading.Lock()
+
+def warm_up(fetch_indices):
+    """Does the work the first request would otherwise pay for."""
+    # Both SWPC products are fetched in parallel while NumPy is imported and exercised;
+    # requests arriving meanwhile wait for these fetches instead of starting their own
+    fetcher = threading.Thread(target=fetch_indices, kwargs={'wait_seconds': None}, daemon=True)
+    fetcher.start()
+    stage = run_propagation_stage(WARM_UP_PARAMS, WARM_UP_INDICES)
+    serialize_results(stage, run_link_budget_stage(stage, WARM_UP_PARAMS))
+    if fetch_indices is get_latest_indices: # asgi.py fetches with httpx on its event loop instead
+        get_noaa_session() # Waits for the fetchers' session, or creates it, so requests is imported too
+    WARM_UP_IMPORTS_DONE.set()
+    fetcher.join()
+
+def run_background_tasks(fetch_indices):
+    try:
+        warm_up(fetch_indices)
+    except Exception as e:
+        print(f"Error during startup warm-up: {e}")
+        traceback.print_exc()
+    finally:
+        WARM_UP_IMPORTS_DONE.set()
+        WARM_UP_DONE.set() # Requests are served either way; a failed warm-up only makes them slower
+    if PRECOMPUTE_ENABLED:
+        run_precompute_scheduler(fetch_indices)
+
+def start_background_tasks(fetch_indices=get_latest_indices):
+    """Starts the warm-up/precompute thread once per process (again in forked workers).
+
+    fetch_indices(wait_seconds=...) gets the SWPC indices for it; it must share its
+    fetches with the server's request handlers, so requests wait for them rather than
+    starting duplicates.
+    """
+    global background_tasks_pid
+    if background_tasks_pid == os.getpid():
+        return
+    with background_tasks_lock:
+        if background_tasks_pid != os.getpid():
+            background_tasks_pid = os.getpid()
+            threading.Thread(target=run_background_tasks, args=(fetch_indices,), name='background-tasks',
+                             daemon=True).start()
+
+def wait_for_warm_up():
+    # Runs before every fork (process pool workers, gunicorn --preload workers). The warm-up
+    # imports NumPy and requests; a child forked halfway through an import inherits that
+    # module's import lock, held by a thread that doesn't exist in the child, and deadlocks.
+    # Only the imports are waited for: the SWPC fetches can take far longer and are safe to
+    # fork during, as the child gets fresh locks and session (see reset_after_fork).
+    if background_tasks_pid == os.getpid():
+        WARM_UP_IMPORTS_DONE.wait(NOAA_TIMEOUT_SECONDS)
+
+def reset_after_fork():
+    # Locks held by the parent's threads at fork time would never be released in the child,
+    # and the child must not share the parent's keep-alive connections
+    global NOAA_SESSION, NOAA_SESSION_LOCK, NOAA_REFRESH_THREADS, NOAA_REFRESH_LOCK, SIMULATION_CACHE_LOCK
+    global PATH_POPULARITY_LOCK, background_tasks_lock, APP_LOCK
+    NOAA_SESSION = None
+    NOAA_SESSION_LOCK = threading.Lock()
+    NOAA_REFRESH_THREADS = {}
+    NOAA_REFRESH_LOCK = threading.Lock()
+    SIMULATION_CACHE_LOCK = threading.Lock()
+    PATH_POPULARITY_LOCK = threading.Lock()
+    background_tasks_lock = threading.Lock()
+    APP_LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'): # Not available on Windows, which doesn't fork
+    os.register_at_fork(before=wait_for_warm_up, after_in_child=reset_after_fork)
+
+def get_readiness():
+    """Returns (ready, details) for /ready.
+
+    Ready once the warm-up has finished, which means the SWPC indices were loaded, or
+    could not be fetched and the defaults are being served instead.
+    """
+    indices = {}
+    for product_key in NOAA_URLS:
+        cache_entry = NOAA_CACHE.get(product_key) or {}
+        if cache_entry.get('data') is not None: indices[product_key] = 'loaded'
+        elif cache_entry.get('failed_at'): indices[product_key] = 'unavailable'
+        else: indices[product_key] = 'loading'
+    ready = WARM_UP_DONE.is_set()
+    return ready, {'ready': ready, 'indices': indices, 'warmPaths': len(WARM_CACHE)}
 
 
 # --- Flask Routes ---
-# @app.route('/') and @app.route('/simulate', ...) remain the same
-# as the previous version, including validation.
-@app.route('/')
+# Registered on the app in create_app()
 def index():
     """Serves the main HTML page."""
-    return render_template('index.html')
+    return flask.render_template('index.html')
+
+def ready():
+    """Readiness probe: 200 once startup warm-up is done, 503 before."""
+    is_ready, details = get_readiness()
+    return flask.jsonify(details), 200 if is_ready else 503
 
-@app.route('/simulate', methods=['POST'])
 def simulate():
     """Handles simulation requests from the frontend."""
     try:
-        params = request.get_json()
+        params = flask.request.get_json()
         if not params:
-             return jsonify({"error": "Invalid JSON payload received."}), 400
+             return flask.jsonify({"error": "Invalid JSON payload received."}), 400
 
-        # --- Enhanced Input Validation ---
-        validated_params = {}
-        required_keys = ['txLat', 'txLon', 'rxLat', 'rxLon', 'txPowerW', 'startFreq', 'endFreq', 'freqSteps',
-                         'txAntennaType', 'txAntennaHeight', 'rxAntennaType', 'rxAntennaHeight', 'noiseEnvironment']
-        missing_keys = [key for key in required_keys if key not in params]
-        if missing_keys:
-             return jsonify({"error": f"Missing required parameters: {', '.join(missing_keys)}"}), 400
+        if isinstance(params, list):
+            # Batch request: one NOAA lookup, per-item errors by index
+            try:
+                validated, errors = validate_simulation_batch(params)
+            except ValueError as e:
+                 return flask.jsonify({"error": str(e)}), 400
+            body = serialize_simulation_batch(validated, errors, get_latest_indices())
+            return flask.current_app.response_class(body, mimetype='application/json') # Streamed
 
-        # Validate numeric types and ranges
         try:
-            validated_params['txLat'] = float(params['txLat'])
-            if not (-90 <= validated_params['txLat'] <= 90): raise ValueError("Tx Latitude out of range (-90 to 90).")
-            validated_params['txLon'] = float(params['txLon'])
-            if not (-180 <= validated_params['txLon'] <= 180): raise ValueError("Tx Longitude out of range (-180 to 180).")
-            validated_params['rxLat'] = float(params['rxLat'])
-            if not (-90 <= validated_params['rxLat'] <= 90): raise ValueError("Rx Latitude out of range (-90 to 90).")
-            validated_params['rxLon'] = float(params['rxLon'])
-            if not (-180 <= validated_params['rxLon'] <= 180): raise ValueError("Rx Longitude out of range (-180 to 180).")
-            validated_params['txPowerW'] = float(params['txPowerW'])
-            if not (0 < validated_params['txPowerW'] <= MAX_TX_POWER): raise ValueError(f"Tx Power must be between 0 and {MAX_TX_POWER} Watts.")
-            validated_params['startFreq'] = float(params['startFreq'])
-            if not (1.8 <= validated_params['startFreq'] <= 30.0): raise ValueError("Start Frequency out of range (1.8 to 30.0 MHz).")
-            validated_params['endFreq'] = float(params['endFreq'])
-            if not (1.8 <= validated_params['endFreq'] <= 30.0): raise ValueError("End Frequency out of range (1.8 to 30.0 MHz).")
-            if validated_params['endFreq'] < validated_params['startFreq']: raise ValueError("End Frequency must be >= Start Frequency.")
-            validated_params['freqSteps'] = int(params['freqSteps'])
-            if not (1 <= validated_params['freqSteps'] <= MAX_FREQ_STEPS): raise ValueError(f"Frequency Steps must be between 1 and {MAX_FREQ_STEPS}.")
-            if validated_params['freqSteps'] > 1 and validated_params['endFreq'] == validated_params['startFreq']:
-                raise ValueError("Start and End Frequency cannot be the same when Steps > 1.")
-        except (ValueError, TypeError) as e:
-             return jsonify({"error": f"Invalid numeric parameter: {e}"}), 400
-
-        # Validate string selections
-        validated_params['txAntennaType'] = params['txAntennaType']
-        if validated_params['txAntennaType'] not in ALLOWED_ANTENNA_TYPES:
-             return jsonify({"error": f"Invalid Tx Antenna Type: {validated_params['txAntennaType']}"}), 400
-        validated_params['txAntennaHeight'] = params['txAntennaHeight']
-        if validated_params['txAntennaHeight'] not in ALLOWED_ANTENNA_HEIGHTS:
-             return jsonify({"error": f"Invalid Tx Antenna Height: {validated_params['txAntennaHeight']}"}), 400
-        validated_params['rxAntennaType'] = params['rxAntennaType']
-        if validated_params['rxAntennaType'] not in ALLOWED_ANTENNA_TYPES:
-             return jsonify({"error": f"Invalid Rx Antenna Type: {validated_params['rxAntennaType']}"}), 400
-        validated_params['rxAntennaHeight'] = params['rxAntennaHeight']
-        if validated_params['rxAntennaHeight'] not in ALLOWED_ANTENNA_HEIGHTS:
-             return jsonify({"error": f"Invalid Rx Antenna Height: {validated_params['rxAntennaHeight']}"}), 400
-        validated_params['noiseEnvironment'] = params['noiseEnvironment']
-        if validated_params['noiseEnvironment'] not in ALLOWED_NOISE_ENV:
-             return jsonify({"error": f"Invalid Noise Environment: {validated_params['noiseEnvironment']}"}), 400
+            validated_params = validate_simulation_params(params)
+        except ValueError as e:
+             return flask.jsonify({"error": str(e)}), 400
 
         # --- Validation Passed ---
-        results = run_hf_simulation(validated_params)
-        return jsonify(results)
+        real_time_indices = get_latest_indices()
+        record_path_request(validated_params)
+        stage = get_warm_stage(validated_params, real_time_indices)
+        if stage is None:
+            stage = run_propagation_stage(validated_params, real_time_indices)
+        link_budget = run_link_budget_stage(stage, validated_params)
+        response = flask.current_app.response_class(serialize_results(stage, link_budget) + '\n', mimetype='application/json')
+        response.headers['X-Result-Id'] = store_propagation_stage(stage)
+        return response
 
     except Exception as e:
         print(f"Unhandled Exception during simulation: {e}")
         traceback.print_exc()
-        return jsonify({"error": "An internal server error occurred during simulation."}), 500
+        return flask.jsonify({"error": "An internal server error occurred during simulation."}), 500
+
+def simulate_update():
+    """Re-applies changed power/antenna/noise settings to a previous /simulate result."""
+    try:
+        params = flask.request.get_json()
+        if not params:
+             return flask.jsonify({"error": "Invalid JSON payload received."}), 400
+
+        try:
+            validated_params = validate_link_budget_params(params)
+        except ValueError as e:
+             return flask.jsonify({"error": str(e)}), 400
+
+        # Unknown or expired ids get a 404 so the client can fall back to a full /simulate
+        stage = get_propagation_stage(params['resultId'])
+        if stage is None:
+             return flask.jsonify({"error": "Unknown or expired result id."}), 404
+
+        link_budget = run_link_budget_stage(stage, validated_params)
+        response = flask.current_app.response_class(serialize_results(stage, link_budget) + '\n', mimetype='application/json')
+        response.headers['X-Result-Id'] = params['resultId']
+        return response
+
+    except Exception as e:
+        print(f"Unhandled Exception during simulation update: {e}")
+        traceback.print_exc()
+        return flask.jsonify({"error": "An internal server error occurred during simulation."}), 500
+
+# --- Flask App Initialization ---
+APP_LOCK = threading.Lock()
+
+def create_app():
+    """Builds the Flask app and starts the background warm-up."""
+    flask_app = flask.Flask(__name__)
+    flask_app.after_request(add_security_headers)
+    # WSGI servers may create the app before forking workers, which lose the thread
+    flask_app.before_request(start_background_tasks)
+    flask_app.add_url_rule('/', view_func=index)
+    flask_app.add_url_rule('/simulate', view_func=simulate, methods=['POST'])
+    flask_app.add_url_rule('/simulate/update', view_func=simulate_update, methods=['POST'])
+    if READINESS_ENDPOINT_ENABLED:
+        flask_app.add_url_rule('/ready', view_func=ready)
+    flask_app.jinja_env.get_template('index.html') # Compile now rather than on the first page load
+    start_background_tasks()
+    return flask_app
+
+def __getattr__(name):
+    # `app` is created on first access (flask --app app run, gunicorn app:app), so importing
+    # this module for the simulation alone, like asgi.py does, never loads Flask
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with APP_LOCK:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+    return globals()['app']
 
 # --- Main Execution ---
 if __name__ == '__main__':
     # IMPORTANT: debug=True is for development only!
     # Remove or set to False for production deployment.
     # Use a proper WSGI server like Gunicorn or Waitress instead of app.run() in production.
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    create_app().run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,284 @@
+"""ASGI serving mode for the HF simulator.
+
+Serves the same routes as the Flask app in app.py, but fetches SWPC data with a
+pooled async HTTP client and runs the simulation in an executor, so slow NOAA
+responses never block other requests.
+
+Run with e.g.:
+    uvicorn asgi:app --workers 4
+Optional dependencies: starlette, httpx, uvicorn.
+
+Results cached for /simulate/update live in each worker process (see
+app.SIMULATION_CACHE); an ASGI_SIMULATION_PROCESSES pool doesn't change that,
+as the worker that handled /simulate stores the stage. With --workers > 1 an
+update that lands on another worker gets a 404 and the page re-runs the full
+simulation; a sticky load balancer avoids the extra work.
+
+Environment:
+    NOAA_BASE_URL              - SWPC base URL (point at a local stub for load tests)
+    ASGI_SIMULATION_PROCESSES  - run simulations in a process pool of this size (default: thread pool)
+    ASGI_SIMULATION_THREADS    - thread pool size when no process pool is used (default: 4)
+    ASGI_MAX_NOAA_CONNECTIONS  - connection pool size for SWPC fetches (default: app.NOAA_POOL_SIZE)
+    PRECOMPUTE_*, POPULAR_PATHS_FILE - popular path warm cache, as for app.py
+    READINESS_ENDPOINT         - '0' disables the /ready readiness probe, as for app.py
+    SIMULATION_CACHE_MAX_BYTES - memory bound of the /simulate/update result cache, as for app.py
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import json
+import os
+import time
+import traceback
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import HTMLResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import app as hf # Physics, validation and caches are shared with the Flask app
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIMULATION_PROCESSES = int(os.environ.get('ASGI_SIMULATION_PROCESSES', '0'))
+SIMULATION_THREADS = int(os.environ.get('ASGI_SIMULATION_THREADS', '4'))
+MAX_NOAA_CONNECTIONS = int(os.environ.get('ASGI_MAX_NOAA_CONNECTIONS', str(hf.NOAA_POOL_SIZE)))
+
+# Created in lifespan() so they belong to the worker's event loop
+http_client = None
+simulation_executor = None
+noaa_refresh_tasks = {} # product key -> task fetching it, one at a time per product
+
+# The page is static, so it is read once at startup instead of on every request
+with open(os.path.join(BASE_DIR, 'templates', 'index.html'), encoding='utf-8') as f:
+    INDEX_HTML = f.read()
+
+
+class FlaskJSONResponse(Response):
+    """JSON response serialized like Flask's jsonify (sorted keys, compact, Infinity allowed)."""
+    media_type = 'application/json'
+
+    def render(self, content):
+        return (json.dumps(content, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+# --- NOAA Data Fetching ---
+async def get_noaa_data_async(product_key, url, wait_seconds=hf.NOAA_REQUEST_WAIT_SECONDS):
+    """Async version of app.get_noaa_data, sharing its NOAA_CACHE, refresh intervals and retry settings.
+
+    Stale data is served straight away while a background task refreshes it; with nothing
+    cached yet, waits up to wait_seconds (None: until the refresh ends) for the refresh.
+    """
+    cache_entry = hf.NOAA_CACHE.get(product_key)
+    if hf.is_noaa_cache_fresh(product_key, cache_entry, time.time()):
+        return cache_entry['data']
+
+    refresh_task = refresh_noaa_data_async(product_key, url)
+    if cache_entry is None or cache_entry['data'] is None:
+        await asyncio.wait([refresh_task], timeout=wait_seconds) # Times out without cancelling the refresh
+        cache_entry = hf.NOAA_CACHE.get(product_key)
+    return cache_entry['data'] if cache_entry else None
+
+
+def refresh_noaa_data_async(product_key, url):
+    """Starts fetching one product in a background task, unless one is already; returns that task."""
+    refresh_task = noaa_refresh_tasks.get(product_key)
+    if refresh_task is None or refresh_task.done():
+        refresh_task = asyncio.ensure_future(fetch_noaa_data_async(product_key, url))
+        noaa_refresh_tasks[product_key] = refresh_task # Also keeps the task from being garbage collected
+    return refresh_task
+
+
+async def fetch_noaa_data_async(product_key, url):
+    """Fetches one product upstream (see refresh_noaa_data_async)."""
+    now = time.time()
+    cache_entry = hf.NOAA_CACHE.get(product_key)
+    if hf.is_noaa_cache_fresh(product_key, cache_entry, now): # Unless a refresh just ended
+        return
+    try:
+        response = await fetch_with_retries(url, hf.get_conditional_headers(cache_entry))
+        if response.status_code == 304 and cache_entry and cache_entry['data'] is not None:
+            # Unchanged upstream: keep the already-parsed data and just extend its TTL
+            cache_entry['timestamp'] = now
+            return
+        response.raise_for_status()
+        hf.store_noaa_data(product_key, response.json(), response.headers, now)
+    except httpx.HTTPError as e:
+        print(f"Error fetching NOAA data for {product_key}: {e}")
+        hf.mark_noaa_failure(product_key, now)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON for {product_key}: {e}")
+        hf.mark_noaa_failure(product_key, now)
+
+
+async def fetch_with_retries(url, headers):
+    """GETs url, retrying transport errors and retryable statuses with exponential backoff."""
+    for attempt in range(hf.NOAA_MAX_RETRIES + 1):
+        is_last_attempt = attempt == hf.NOAA_MAX_RETRIES
+        try:
+            response = await http_client.get(url, headers=headers)
+            if response.status_code not in hf.NOAA_RETRY_STATUSES or is_last_attempt:
+                return response
+        except httpx.TransportError:
+            if is_last_attempt: raise
+        await asyncio.sleep(hf.NOAA_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+async def get_latest_indices_async(wait_seconds=hf.NOAA_REQUEST_WAIT_SECONDS):
+    """Fetches both SWPC products concurrently and extracts the latest indices."""
+    srf_data, kp_data = await asyncio.gather(
+        get_noaa_data_async('radio_flux', hf.NOAA_URLS['radio_flux'], wait_seconds),
+        get_noaa_data_async('kp_7day', hf.NOAA_URLS['kp_7day'], wait_seconds),
+    )
+    return hf.parse_latest_indices(srf_data, kp_data)
+
+
+def get_latest_indices_threadsafe(loop, wait_seconds=hf.NOAA_REQUEST_WAIT_SECONDS):
+    """get_latest_indices_async for app's background thread, run on the worker's event loop.
+
+    The warm-up and precompute fetches then share the refresh tasks of async requests.
+    """
+    return asyncio.run_coroutine_threadsafe(get_latest_indices_async(wait_seconds), loop).result()
+
+
+# --- Simulation ---
+def run_simulation_job(params, real_time_indices):
+    """Runs both simulation stages and serializes the result; executed in the simulation executor."""
+    stage = hf.run_propagation_stage(params, real_time_indices)
+    return stage, hf.serialize_results(stage, hf.run_link_budget_stage(stage, params))
+
+
+def results_response(body, result_id):
+    return Response(body + '\n', media_type='application/json', headers={'X-Result-Id': result_id})
+
+
+async def read_json_payload(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+# --- Routes ---
+async def index(request):
+    """Serves the main HTML page."""
+    return HTMLResponse(INDEX_HTML)
+
+
+async def ready(request):
+    """Readiness probe: 200 once startup warm-up is done, 503 before."""
+    is_ready, details = hf.get_readiness()
+    return FlaskJSONResponse(details, status_code=200 if is_ready else 503)
+
+
+async def simulate(request):
+    """Handles simulation requests from the frontend."""
+    try:
+        params = await read_json_payload(request)
+        if not params:
+            return FlaskJSONResponse({"error": "Invalid JSON payload received."}, status_code=400)
+        loop = asyncio.get_running_loop()
+        if isinstance(params, list):
+            # Batch request: one NOAA lookup, per-item errors by index
+            try:
+                validated, errors = hf.validate_simulation_batch(params)
+            except ValueError as e:
+                return FlaskJSONResponse({"error": str(e)}, status_code=400)
+            real_time_indices = await get_latest_indices_async()
+            batch = await loop.run_in_executor(simulation_executor, hf.run_simulation_batch, validated, real_time_indices)
+            # Serialized item by item as it is sent (Starlette iterates it in its thread pool)
+            return StreamingResponse(hf.iter_simulation_batch_json(errors, batch), media_type='application/json')
+
+        try:
+            validated_params = hf.validate_simulation_params(params)
+        except ValueError as e:
+            return FlaskJSONResponse({"error": str(e)}, status_code=400)
+
+        real_time_indices = await get_latest_indices_async()
+        hf.record_path_request(validated_params)
+        stage = hf.get_warm_stage(validated_params, real_time_indices)
+        if stage is not None:
+            # Precomputed: only the sub-millisecond link budget is left, so it runs inline
+            body = hf.serialize_results(stage, hf.run_link_budget_stage(stage, validated_params))
+        else:
+            stage, body = await loop.run_in_executor(
+                simulation_executor, run_simulation_job, validated_params, real_time_indices)
+        return results_response(body, hf.store_propagation_stage(stage))
+
+    except Exception as e:
+        print(f"Unhandled Exception during simulation: {e}")
+        traceback.print_exc()
+        return FlaskJSONResponse({"error": "An internal server error occurred during simulation."}, status_code=500)
+
+
+async def simulate_update(request):
+    """Re-applies changed power/antenna/noise settings to a previous /simulate result."""
+    try:
+        params = await read_json_payload(request)
+        if not params:
+            return FlaskJSONResponse({"error": "Invalid JSON payload received."}, status_code=400)
+
+        try:
+            validated_params = hf.validate_link_budget_params(params)
+        except ValueError as e:
+            return FlaskJSONResponse({"error": str(e)}, status_code=400)
+
+        stage = hf.get_propagation_stage(params['resultId'])
+        if stage is None:
+            return FlaskJSONResponse({"error": "Unknown or expired result id."}, status_code=404)
+
+        # The link budget is sub-millisecond, so it runs inline on the event loop
+        link_budget = hf.run_link_budget_stage(stage, validated_params)
+        return results_response(hf.serialize_results(stage, link_budget), params['resultId'])
+
+    except Exception as e:
+        print(f"Unhandled Exception during simulation update: {e}")
+        traceback.print_exc()
+        return FlaskJSONResponse({"error": "An internal server error occurred during simulation."}, status_code=500)
+
+
+# --- App Setup ---
+class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers.update(hf.SECURITY_HEADERS)
+        return response
+
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    global http_client, simulation_executor
+    http_client = httpx.AsyncClient(
+        timeout=hf.NOAA_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=MAX_NOAA_CONNECTIONS, max_keepalive_connections=MAX_NOAA_CONNECTIONS),
+    )
+    if SIMULATION_PROCESSES > 0:
+        simulation_executor = concurrent.futures.ProcessPoolExecutor(max_workers=SIMULATION_PROCESSES)
+    else:
+        simulation_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SIMULATION_THREADS)
+    # Warm up (NOAA indices, NumPy) and precompute popular paths in the background
+    hf.start_background_tasks(functools.partial(get_latest_indices_threadsafe, asyncio.get_running_loop()))
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        simulation_executor.shutdown(wait=False, cancel_futures=True)
+
+
+routes = [
+    Route('/', index),
+    Route('/simulate', simulate, methods=['POST']),
+    Route('/simulate/update', simulate_update, methods=['POST']),
+    Mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static'),
+]
+if hf.READINESS_ENDPOINT_ENABLED:
+    routes.insert(1, Route('/ready', ready))
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(SecurityHeadersMiddleware)],
+    lifespan=lifespan,
+)
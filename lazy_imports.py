@@ -0,0 +1,43 @@
+"""Deferred imports for app.py, asgi.py and Offline/app.py.
+
+NumPy, requests and Flask make up most of the time it takes to import the
+apps. A LazyModule stands in for such a module until one of its attributes is
+first used, then imports it and rebinds the name in the owning module, so
+later lookups are plain global lookups with no proxy in between.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    """Placeholder for a module that is imported on first attribute access."""
+
+    def __init__(self, module_name, owner_globals, name):
+        self._module_name = module_name
+        self._owner_globals = owner_globals
+        self._name = name
+
+    def load(self):
+        """Imports the module (once; importlib serializes concurrent imports) and returns it."""
+        module = importlib.import_module(self._module_name)
+        if self._owner_globals.get(self._name) is self:
+            self._owner_globals[self._name] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._module_name!r}>"
+
+
+def lazy_import(module_name, owner_globals, name):
+    """Returns module_name if it is already imported, else a LazyModule bound to owner_globals[name].
+
+    Usage, at module level:
+        np = lazy_import('numpy', globals(), 'np')
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    return LazyModule(module_name, owner_globals, name)
@@ -0,0 +1,404 @@
+"""Load-testing harness for the HF simulator.
+
+Starts the stub SWPC server (stub_swpc.py) and the app under test, drives
+/simulate with a set of workload profiles, and reports throughput, latency
+percentiles and error rates per profile. Each run is saved as a JSON artifact
+under loadtest/results/ so runs can be compared with --compare.
+
+Usage:
+    python loadtest/run_loadtest.py --target online --duration 20 --concurrency 16
+    python loadtest/run_loadtest.py --target offline --profiles single-path max-sweep
+    python loadtest/run_loadtest.py --target asgi --stub-latency-ms 300 --stub-failure-rate 0.1
+    python loadtest/run_loadtest.py --url http://127.0.0.1:8000   # already-running server
+    python loadtest/run_loadtest.py --compare results/a.json results/b.json
+
+Targets: online (app.py via the Flask server), offline (Offline/app.py),
+asgi (asgi.py via uvicorn; needs starlette, httpx and uvicorn installed).
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(LOADTEST_DIR)
+RESULTS_DIR = os.path.join(LOADTEST_DIR, 'results')
+
+MAX_FREQ_STEPS = 100 # Matches MAX_FREQ_STEPS in app.py
+ANTENNA_TYPES = ['Dipole', 'Vertical', 'Yagi (Simple)']
+ANTENNA_HEIGHTS = ['Low (<0.25λ)', 'Medium (≈0.5λ)', 'High (>0.75λ)']
+NOISE_ENVIRONMENTS = ['Quiet Rural', 'Rural', 'Residential', 'Urban', 'Industrial']
+HAM_BAND_FREQS = [1.9, 3.6, 5.3, 7.1, 10.1, 14.2, 18.1, 21.2, 24.9, 28.4]
+
+# A handful of frequently simulated paths (tx lat, tx lon, rx lat, rx lon)
+POPULAR_PATHS = [
+    (35.17, -79.41, 40.71, -74.00),  # North Carolina -> New York (default UI path)
+    (51.50, -0.12, 40.71, -74.00),   # London -> New York
+    (35.68, 139.69, 37.77, -122.42), # Tokyo -> San Francisco
+    (-33.87, 151.21, 51.50, -0.12),  # Sydney -> London
+    (64.84, -147.72, 59.33, 18.07),  # Fairbanks -> Stockholm (auroral)
+]
+
+# Request kinds:
+#   single - one frequency on a path
+#   sweep  - full MAX_FREQ_STEPS sweep across 1.8-30 MHz
+#   update - /simulate/update on the worker's last result (falls back to /simulate)
+# paths: 'popular' repeats POPULAR_PATHS, 'random' uses a new path for every request.
+# server_env is applied to the app under test (NOAA_CACHE_SECONDS=0 keeps SWPC refreshes running nonstop).
+PROFILES = {
+    'single-path': {'mix': {'single': 1.0}, 'paths': 'popular'},
+    'max-sweep': {'mix': {'sweep': 1.0}, 'paths': 'popular'},
+    'cache-hit-heavy': {'mix': {'update': 0.7, 'single': 0.2, 'sweep': 0.1}, 'paths': 'popular'},
+    'cache-miss-heavy': {'mix': {'single': 0.6, 'sweep': 0.4}, 'paths': 'random',
+                         'server_env': {'NOAA_CACHE_SECONDS': '0'}},
+    'mixed': {'mix': {'single': 0.5, 'update': 0.3, 'sweep': 0.2}, 'paths': 'random'},
+}
+
+
+# --- Process Management ---
+def start_process(command, cwd, env):
+    # Output goes to a temp file: an unread pipe fills up with request logs and stalls the server
+    log_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    process.log_file = log_file
+    return process
+
+
+def stop_process(process):
+    if process and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    if process:
+        process.log_file.close()
+
+
+def wait_until_ready(base_url, path, process=None, timeout=30):
+    """Polls base_url + path until it answers, or raises if the process dies or the timeout passes."""
+    parsed = urllib.parse.urlsplit(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            process.log_file.seek(0)
+            output = process.log_file.read().decode('utf-8', 'replace')
+            raise RuntimeError(f"Process exited while starting ({base_url}):\n{output[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=2)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {base_url}{path}")
+
+
+def start_stub(args):
+    command = [sys.executable, os.path.join(LOADTEST_DIR, 'stub_swpc.py'), '--port', str(args.stub_port),
+               '--latency-ms', str(args.stub_latency_ms), '--jitter-ms', str(args.stub_jitter_ms),
+               '--failure-rate', str(args.stub_failure_rate)]
+    process = start_process(command, REPO_DIR, os.environ.copy())
+    wait_until_ready(f"http://127.0.0.1:{args.stub_port}", '/json/solar-radio-flux.json', process)
+    return process
+
+
+def start_app(args, server_env):
+    """Starts the target app and returns (process, base_url)."""
+    env = os.environ.copy()
+    env['NOAA_BASE_URL'] = f"http://127.0.0.1:{args.stub_port}"
+    # Don't read or overwrite the deployment's popular path list; every run starts without one
+    env['POPULAR_PATHS_FILE'] = ''
+    env.update(server_env)
+    port = str(args.app_port)
+    if args.target == 'online':
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', port, '--with-threads']
+        cwd = REPO_DIR
+    elif args.target == 'offline':
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', port, '--with-threads']
+        cwd = os.path.join(REPO_DIR, 'Offline')
+    else: # asgi
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', port,
+                   '--workers', str(args.workers), '--log-level', 'warning']
+        cwd = REPO_DIR
+    process = start_process(command, cwd, env)
+    base_url = f"http://127.0.0.1:{port}"
+    wait_until_ready(base_url, '/', process)
+    return process, base_url
+
+
+# --- Workload Generation ---
+def random_path(rng, paths_mode):
+    if paths_mode == 'popular':
+        return rng.choice(POPULAR_PATHS)
+    return (round(rng.uniform(-70, 70), 2), round(rng.uniform(-180, 180), 2),
+            round(rng.uniform(-70, 70), 2), round(rng.uniform(-180, 180), 2))
+
+
+def build_simulate_payload(rng, kind, paths_mode, offline):
+    tx_lat, tx_lon, rx_lat, rx_lon = random_path(rng, paths_mode)
+    payload = {
+        'txLat': tx_lat, 'txLon': tx_lon, 'rxLat': rx_lat, 'rxLon': rx_lon,
+        'txPowerW': rng.choice([5, 100, 400, 1500]),
+        'txAntennaType': rng.choice(ANTENNA_TYPES), 'txAntennaHeight': rng.choice(ANTENNA_HEIGHTS),
+        'rxAntennaType': rng.choice(ANTENNA_TYPES), 'rxAntennaHeight': rng.choice(ANTENNA_HEIGHTS),
+        'noiseEnvironment': rng.choice(NOISE_ENVIRONMENTS),
+    }
+    if kind == 'sweep':
+        payload.update(startFreq=1.8, endFreq=30.0, freqSteps=MAX_FREQ_STEPS)
+    else:
+        freq = rng.choice(HAM_BAND_FREQS)
+        payload.update(startFreq=freq, endFreq=freq, freqSteps=1)
+    if offline: # Offline/app.py takes the indices from the user
+        payload.update(sfi=rng.randint(70, 200), ssn=rng.randint(0, 150), kp=rng.randint(0, 6))
+    return payload
+
+
+def build_update_payload(rng, result_id):
+    return {
+        'resultId': result_id,
+        'txPowerW': rng.choice([5, 50, 100, 400, 1000]),
+        'txAntennaType': rng.choice(ANTENNA_TYPES), 'txAntennaHeight': rng.choice(ANTENNA_HEIGHTS),
+        'rxAntennaType': rng.choice(ANTENNA_TYPES), 'rxAntennaHeight': rng.choice(ANTENNA_HEIGHTS),
+        'noiseEnvironment': rng.choice(NOISE_ENVIRONMENTS),
+    }
+
+
+class Worker(threading.Thread):
+    """Sends requests back to back on one keep-alive connection until stop_at."""
+
+    def __init__(self, base_url, profile, offline, seed, record_from, stop_at):
+        super().__init__(daemon=True)
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.profile = profile
+        self.offline = offline
+        self.rng = random.Random(seed)
+        self.record_from = record_from
+        self.stop_at = stop_at
+        self.samples = [] # (kind, latency_s, status) where status is an HTTP code or an exception name
+        self.result_id = None
+        self.conn = None
+
+    def post(self, path, payload):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            self.conn.request('POST', path, body=json.dumps(payload),
+                              headers={'Content-Type': 'application/json'})
+            response = self.conn.getresponse()
+            response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                self.conn.close()
+                self.conn = None
+            return response.status, response.getheader('X-Result-Id')
+        except (OSError, http.client.HTTPException) as e:
+            self.conn.close()
+            self.conn = None
+            return type(e).__name__, None
+
+    def run(self):
+        kinds = list(self.profile['mix'])
+        weights = [self.profile['mix'][kind] for kind in kinds]
+        while time.time() < self.stop_at:
+            kind = self.rng.choices(kinds, weights)[0]
+            if kind == 'update' and (self.offline or not self.result_id):
+                kind = 'single' # Offline has no /simulate/update; others need a result id first
+            start = time.perf_counter()
+            if kind == 'update':
+                status, _ = self.post('/simulate/update', build_update_payload(self.rng, self.result_id))
+                if status == 404: # Expired result: fall back to a full simulation, like the frontend
+                    self.result_id = None
+            else:
+                payload = build_simulate_payload(self.rng, kind, self.profile['paths'], self.offline)
+                status, result_id = self.post('/simulate', payload)
+                if result_id:
+                    self.result_id = result_id
+            latency = time.perf_counter() - start
+            if time.time() >= self.record_from:
+                self.samples.append((kind, latency, status))
+        if self.conn:
+            self.conn.close()
+
+
+# --- Reporting ---
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, duration):
+    latencies_ms = sorted(latency * 1000 for _, latency, _ in samples)
+    errors_by_status = {}
+    for _, _, status in samples:
+        if status != 200:
+            errors_by_status[str(status)] = errors_by_status.get(str(status), 0) + 1
+    errors = sum(errors_by_status.values())
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / duration, 2) if duration > 0 else 0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'p50_ms': round(percentile(latencies_ms, 50), 3) if samples else None,
+        'p95_ms': round(percentile(latencies_ms, 95), 3) if samples else None,
+        'p99_ms': round(percentile(latencies_ms, 99), 3) if samples else None,
+        'max_ms': round(latencies_ms[-1], 3) if samples else None,
+        'errors_by_status': errors_by_status,
+    }
+
+
+def run_profile(name, profile, base_url, args):
+    offline = args.target == 'offline'
+    start = time.time()
+    record_from = start + args.warmup
+    stop_at = record_from + args.duration
+    workers = [Worker(base_url, profile, offline, args.seed + i, record_from, stop_at)
+               for i in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    samples = [sample for worker in workers for sample in worker.samples]
+    result = summarize(samples, args.duration)
+    result['by_kind'] = {kind: summarize([s for s in samples if s[0] == kind], args.duration)
+                         for kind in sorted({s[0] for s in samples})}
+    return result
+
+
+def print_report(report):
+    print(f"\nTarget: {report['config']['target']}  concurrency={report['config']['concurrency']}  "
+          f"duration={report['config']['duration_s']}s")
+    header = f"{'profile':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, result in report['profiles'].items():
+        print(f"{name:<18}{result['throughput_rps']:>10}{fmt(result['p50_ms']):>10}{fmt(result['p95_ms']):>10}"
+              f"{fmt(result['p99_ms']):>10}{result['error_rate'] * 100:>8.2f}%")
+
+
+def fmt(value):
+    return '-' if value is None else f"{value:.1f}"
+
+
+def compare_reports(old_path, new_path):
+    """Prints throughput and latency changes between two saved artifacts."""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"old: {old_path} ({old['config']['target']}, {old['meta'].get('git_commit') or '?'})")
+    print(f"new: {new_path} ({new['config']['target']}, {new['meta'].get('git_commit') or '?'})")
+    header = f"{'profile':<18}{'req/s':>18}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'errors':>16}"
+    print(header)
+    print('-' * len(header))
+    for name in new['profiles']:
+        if name not in old['profiles']:
+            continue
+        o, n = old['profiles'][name], new['profiles'][name]
+        cells = [f"{o[key] or 0:.1f}->{n[key] or 0:.1f}" for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')]
+        cells.append(f"{o['error_rate'] * 100:.1f}->{n['error_rate'] * 100:.1f}%")
+        print(f"{name:<18}" + ''.join(f"{cell:>18}" for cell in cells[:4]) + f"{cells[4]:>16}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_report(report, output):
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['config']['target']}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return output
+
+
+# --- Main ---
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['online', 'offline', 'asgi'], default='online')
+    parser.add_argument('--url', help='Test an already-running server instead of starting one')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES) + ['all'], default=['all'])
+    parser.add_argument('--duration', type=float, default=15, help='Measured seconds per profile')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds before each profile')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client connections')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes (asgi target)')
+    parser.add_argument('--app-port', type=int, default=8702)
+    parser.add_argument('--stub-port', type=int, default=8701)
+    parser.add_argument('--stub-latency-ms', type=float, default=100)
+    parser.add_argument('--stub-jitter-ms', type=float, default=50)
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Artifact path (default: loadtest/results/<timestamp>-<target>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two saved artifacts and exit')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    profile_names = list(PROFILES) if 'all' in args.profiles else args.profiles
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'target': args.target if not args.url else args.url,
+            'concurrency': args.concurrency, 'duration_s': args.duration, 'warmup_s': args.warmup,
+            'workers': args.workers if args.target == 'asgi' else None,
+            'stub': None if args.url else {'latency_ms': args.stub_latency_ms, 'jitter_ms': args.stub_jitter_ms,
+                                           'failure_rate': args.stub_failure_rate},
+            'seed': args.seed,
+        },
+        'profiles': {},
+    }
+
+    stub = None if args.url else start_stub(args)
+    try:
+        for name in profile_names:
+            profile = PROFILES[name]
+            app_process = None
+            try:
+                # Each profile gets a fresh server so caches and server_env start clean
+                if args.url:
+                    base_url = args.url.rstrip('/')
+                else:
+                    app_process, base_url = start_app(args, profile.get('server_env', {}))
+                print(f"Running profile '{name}'...", flush=True)
+                report['profiles'][name] = dict(run_profile(name, profile, base_url, args), definition=profile)
+            finally:
+                stop_process(app_process)
+    finally:
+        stop_process(stub)
+
+    print_report(report)
+    print(f"\nSaved {save_report(report, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
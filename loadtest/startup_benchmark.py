@@ -0,0 +1,179 @@
+"""Cold-start benchmark for the HF simulator.
+
+Starts each app in fresh Python processes and measures how long the module
+import takes, how long building the Flask app takes, and the latency of the
+first page load and the first /simulate request. The online app (app.py) is
+measured twice: with the first request sent straight after startup, and with
+it sent only once /ready reports the warm-up done, as a load balancer with a
+readiness probe would. The offline app (Offline/app.py) has no warm-up and
+is only measured the first way. NOAA data comes from the stub SWPC server
+(stub_swpc.py). Results are saved as a JSON artifact under loadtest/results/.
+
+Usage:
+    python loadtest/startup_benchmark.py --runs 10
+    python loadtest/startup_benchmark.py --scenarios online offline --stub-latency-ms 300
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from run_loadtest import REPO_DIR, RESULTS_DIR, git_commit, start_stub, stop_process
+
+# Runs in the fresh process. Only time and sys are imported before the app, so the
+# import figure isn't flattered by modules the benchmark itself already loaded.
+CHILD_SCRIPT = '''
+import time, sys
+started = time.perf_counter()
+elapsed_ms = lambda since: round((time.perf_counter() - since) * 1000, 3)
+figures = {}
+import app
+figures['import_ms'] = elapsed_ms(started)
+checkpoint = time.perf_counter()
+flask_app = app.app
+figures['app_ms'] = elapsed_ms(checkpoint)
+client = flask_app.test_client()
+if WAIT_READY:
+    while client.get('/ready').status_code != 200:
+        time.sleep(0.005)
+    figures['ready_ms'] = elapsed_ms(started)
+checkpoint = time.perf_counter()
+assert client.get('/').status_code == 200
+figures['first_page_ms'] = elapsed_ms(checkpoint)
+checkpoint = time.perf_counter()
+response = client.post('/simulate', json=PAYLOAD)
+figures['first_simulate_ms'] = elapsed_ms(checkpoint)
+assert response.status_code == 200, response.get_data(as_text=True)
+figures['total_ms'] = elapsed_ms(started)
+import json
+print(json.dumps(figures))
+'''
+
+SIMULATE_PAYLOAD = {
+    'txLat': 35.17, 'txLon': -79.41, 'rxLat': 40.71, 'rxLon': -74.00,
+    'txPowerW': 100, 'startFreq': 14.2, 'endFreq': 14.2, 'freqSteps': 1,
+    'txAntennaType': 'Dipole', 'txAntennaHeight': 'Medium (≈0.5λ)',
+    'rxAntennaType': 'Dipole', 'rxAntennaHeight': 'Medium (≈0.5λ)',
+    'noiseEnvironment': 'Residential',
+}
+
+# cwd: directory the app is imported from; wait_ready: poll /ready before the first request
+SCENARIOS = {
+    'online': {'cwd': REPO_DIR, 'wait_ready': False, 'payload': SIMULATE_PAYLOAD},
+    'online-ready': {'cwd': REPO_DIR, 'wait_ready': True, 'payload': SIMULATE_PAYLOAD},
+    'offline': {'cwd': os.path.join(REPO_DIR, 'Offline'), 'wait_ready': False,
+                'payload': dict(SIMULATE_PAYLOAD, sfi=120, ssn=70, kp=2)},
+}
+FIGURES = ('import_ms', 'app_ms', 'ready_ms', 'first_page_ms', 'first_simulate_ms', 'total_ms')
+
+
+def run_child(scenario, env):
+    """Runs one cold start and returns its figures."""
+    script = (f"WAIT_READY = {scenario['wait_ready']!r}\nPAYLOAD = {scenario['payload']!r}\n" + CHILD_SCRIPT)
+    completed = subprocess.run([sys.executable, '-c', script], cwd=scenario['cwd'], env=env,
+                               capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{completed.stdout[-2000:]}{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    summary = {}
+    for figure in FIGURES:
+        values = sorted(run[figure] for run in runs if figure in run)
+        if values:
+            summary[figure] = {'median': round(statistics.median(values), 3), 'min': values[0], 'max': values[-1]}
+    return summary
+
+
+def run_scenario(name, args, env):
+    scenario = SCENARIOS[name]
+    run_child(scenario, env) # Unrecorded: writes .pyc files and fills the OS file cache
+    runs = [run_child(scenario, env) for _ in range(args.runs)]
+    return {'summary': summarize(runs), 'runs': runs}
+
+
+def python_startup_ms(runs):
+    """Median wall time of a bare interpreter start, for reference."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def print_report(report):
+    print(f"\nCold start ({report['config']['runs']} runs each, median ms; "
+          f"bare interpreter {report['python_startup_ms']} ms)")
+    header = f"{'scenario':<14}" + ''.join(f"{figure[:-3]:>18}" for figure in FIGURES)
+    print(header)
+    print('-' * len(header))
+    for name, result in report['scenarios'].items():
+        cells = [result['summary'].get(figure, {}).get('median') for figure in FIGURES]
+        print(f"{name:<14}" + ''.join(f"{'-' if cell is None else f'{cell:.1f}':>18}" for cell in cells))
+
+
+def save_report(report, output):
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-startup.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return output
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per scenario')
+    parser.add_argument('--stub-port', type=int, default=8701)
+    parser.add_argument('--stub-latency-ms', type=float, default=100)
+    parser.add_argument('--stub-jitter-ms', type=float, default=50)
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0)
+    parser.add_argument('--output', help='Artifact path (default: loadtest/results/<timestamp>-startup.json)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'runs': args.runs,
+            'stub': {'latency_ms': args.stub_latency_ms, 'jitter_ms': args.stub_jitter_ms,
+                     'failure_rate': args.stub_failure_rate},
+        },
+        'python_startup_ms': python_startup_ms(args.runs),
+        'scenarios': {},
+    }
+
+    stub = start_stub(args)
+    try:
+        env = os.environ.copy()
+        env['NOAA_BASE_URL'] = f"http://127.0.0.1:{args.stub_port}"
+        env['POPULAR_PATHS_FILE'] = '' # Every run starts without a popular path list, like a new instance
+        for name in args.scenarios:
+            print(f"Running scenario '{name}'...", flush=True)
+            report['scenarios'][name] = run_scenario(name, args, env)
+    finally:
+        stop_process(stub)
+
+    print_report(report)
+    print(f"\nSaved {save_report(report, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Local stub of the NOAA SWPC endpoints used by app.py.
+
+Serves canned solar-radio-flux and 7-day Kp JSON with configurable latency and
+failure rate, and answers conditional requests with 304 like the real service.
+
+Usage:
+    python loadtest/stub_swpc.py --port 8701 --latency-ms 150 --failure-rate 0.05
+Then start the app with NOAA_BASE_URL=http://127.0.0.1:8701
+"""
+import argparse
+import datetime
+import hashlib
+import http.server
+import json
+import random
+import time
+
+SOLAR_RADIO_FLUX_PATH = '/json/solar-radio-flux.json'
+KP_7_DAY_PATH = '/json/geospace/geospce_pred_est_kp_7_day.json'
+
+
+def build_solar_radio_flux(now):
+    """Canned solar-radio-flux.json: a week of observed values followed by predictions."""
+    entries = []
+    for day in range(-7, 4):
+        time_tag = (now + datetime.timedelta(days=day)).strftime('%Y-%m-%dT20:00:00')
+        entries.append({
+            'time_tag': time_tag,
+            'flux': 140 + 3 * day,
+            'observed_or_predicted': 'OBSERVED' if day <= 0 else 'PREDICTED',
+        })
+    return entries
+
+
+def build_kp_7_day(now):
+    """Canned geospce_pred_est_kp_7_day.json: header row, then 3-hourly observed/estimated/predicted rows."""
+    rows = [['time_tag', 'kp', 'status']]
+    start = now.replace(minute=0, second=0, microsecond=0) - datetime.timedelta(days=7)
+    for i in range(7 * 8 + 8):
+        time_tag = (start + datetime.timedelta(hours=3 * i)).strftime('%Y-%m-%dT%H:%M:%S')
+        status = 'observed' if i < 7 * 8 else ('estimated' if i == 7 * 8 else 'predicted')
+        rows.append([time_tag, round(2 + (i % 5) * 0.67, 2), status])
+    return rows
+
+
+class StubSWPCHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real service
+    products = {}
+    latency_s = 0.0
+    jitter_s = 0.0
+    failure_rate = 0.0
+    use_etags = True
+
+    def do_GET(self):
+        delay = self.latency_s + random.uniform(0, self.jitter_s)
+        if delay > 0:
+            time.sleep(delay)
+
+        product = self.products.get(self.path.split('?', 1)[0])
+        if product is None:
+            return self.send_body(404, b'{"error": "not found"}')
+        if random.random() < self.failure_rate:
+            return self.send_body(503, b'{"error": "stub failure"}')
+
+        body, etag = product
+        if self.use_etags and self.headers.get('If-None-Match') == etag:
+            return self.send_body(304, b'', etag)
+        return self.send_body(200, body, etag if self.use_etags else None)
+
+    def send_body(self, status, body, etag=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep the load test output clean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8701)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Fixed delay added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Extra uniformly random delay (0..jitter)')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Fraction of requests answered with 503')
+    parser.add_argument('--no-etag', action='store_true', help='Do not send ETags or answer 304')
+    args = parser.parse_args()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    products = {}
+    for path, data in ((SOLAR_RADIO_FLUX_PATH, build_solar_radio_flux(now)), (KP_7_DAY_PATH, build_kp_7_day(now))):
+        body = json.dumps(data).encode('utf-8')
+        products[path] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+
+    StubSWPCHandler.products = products
+    StubSWPCHandler.latency_s = args.latency_ms / 1000.0
+    StubSWPCHandler.jitter_s = args.jitter_ms / 1000.0
+    StubSWPCHandler.failure_rate = args.failure_rate
+    StubSWPCHandler.use_etags = not args.no_etag
+
+    server = http.server.ThreadingHTTPServer((args.host, args.port), StubSWPCHandler)
+    server.daemon_threads = True
+    print(f"Stub SWPC serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
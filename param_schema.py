@@ -0,0 +1,277 @@
+"""Declarative validation of simulation request parameters.
+
+Shared by app.py, asgi.py and Offline/app.py. A schema is an ordered list of
+checks (typed fields and cross-field rules) compiled once at startup. Payloads
+are then validated column by column: each numeric field is converted for the
+whole batch at once and range checked with NumPy, and every item reports the
+first check it fails, in declaration order. This gives the same error message
+for a single payload as the old hand-written checks.
+"""
+import itertools
+import math
+import operator
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy', globals(), 'np') # Only needed for batches; single payloads never touch it
+
+NUMERIC_ERROR_PREFIX = "Invalid numeric parameter: "
+INVALID_PAYLOAD_ERROR = "Invalid JSON payload received."
+
+
+# --- Check Declarations ---
+def number_field(name, minimum, maximum, message, integer=False, exclusive_minimum=False):
+    """A float (or int) field that must lie within [minimum, maximum]."""
+    return {'kind': 'number', 'name': name, 'min': minimum, 'max': maximum, 'message': message,
+            'integer': integer, 'exclusive_minimum': exclusive_minimum}
+
+def choice_field(name, choices, label):
+    """A field whose value must be one of choices."""
+    return {'kind': 'choice', 'name': name, 'choices': list(choices), 'label': label}
+
+def text_field(name, label):
+    """A required string field with no further constraints."""
+    return {'kind': 'text', 'name': name, 'label': label}
+
+def rule(fields, error_mask, message):
+    """A cross-field check; error_mask(columns) returns True for items that fail it."""
+    return {'kind': 'rule', 'fields': tuple(fields), 'error_mask': error_mask, 'message': message}
+
+
+def simulation_checks(max_tx_power, max_freq_steps, antenna_types, antenna_heights, noise_environments,
+                      extra_numeric_fields=()):
+    """Checks for a /simulate payload; extra_numeric_fields run after the frequency checks."""
+    return [
+        number_field('txLat', -90, 90, "Tx Latitude out of range (-90 to 90)."),
+        number_field('txLon', -180, 180, "Tx Longitude out of range (-180 to 180)."),
+        number_field('rxLat', -90, 90, "Rx Latitude out of range (-90 to 90)."),
+        number_field('rxLon', -180, 180, "Rx Longitude out of range (-180 to 180)."),
+        number_field('txPowerW', 0, max_tx_power, f"Tx Power must be between 0 and {max_tx_power} Watts.",
+                     exclusive_minimum=True),
+        number_field('startFreq', 1.8, 30.0, "Start Frequency out of range (1.8 to 30.0 MHz)."),
+        number_field('endFreq', 1.8, 30.0, "End Frequency out of range (1.8 to 30.0 MHz)."),
+        rule(('startFreq', 'endFreq'), lambda c: c['endFreq'] < c['startFreq'],
+             "End Frequency must be >= Start Frequency."),
+        number_field('freqSteps', 1, max_freq_steps, f"Frequency Steps must be between 1 and {max_freq_steps}.",
+                     integer=True),
+        rule(('startFreq', 'endFreq', 'freqSteps'),
+             lambda c: (c['freqSteps'] > 1) & (c['endFreq'] == c['startFreq']),
+             "Start and End Frequency cannot be the same when Steps > 1."),
+        *extra_numeric_fields,
+        *link_budget_choice_checks(antenna_types, antenna_heights, noise_environments),
+    ]
+
+def link_budget_checks(max_tx_power, antenna_types, antenna_heights, noise_environments):
+    """Checks for a /simulate/update payload."""
+    return [
+        text_field('resultId', 'Result Id'),
+        number_field('txPowerW', 0, max_tx_power, f"Tx Power must be between 0 and {max_tx_power} Watts.",
+                     exclusive_minimum=True),
+        *link_budget_choice_checks(antenna_types, antenna_heights, noise_environments),
+    ]
+
+def link_budget_choice_checks(antenna_types, antenna_heights, noise_environments):
+    return [
+        choice_field('txAntennaType', antenna_types, 'Tx Antenna Type'),
+        choice_field('txAntennaHeight', antenna_heights, 'Tx Antenna Height'),
+        choice_field('rxAntennaType', antenna_types, 'Rx Antenna Type'),
+        choice_field('rxAntennaHeight', antenna_heights, 'Rx Antenna Height'),
+        choice_field('noiseEnvironment', noise_environments, 'Noise Environment'),
+    ]
+
+
+# --- Compiled Schema ---
+class CompiledSchema:
+    """A schema ready to validate payloads; build with compile_schema()."""
+
+    def __init__(self, checks):
+        self.checks = checks
+        self.field_names = [check['name'] for check in checks if check['kind'] != 'rule']
+        self.get_fields = operator.itemgetter(*self.field_names)
+        if len(self.field_names) == 1: # itemgetter returns a bare value for a single key
+            get_field = self.get_fields
+            self.get_fields = lambda payload: (get_field(payload),)
+        # Membership sets are built once; choices must be hashable strings
+        self.choice_sets = {check['name']: frozenset(check['choices'])
+                            for check in checks if check['kind'] == 'choice'}
+
+    def missing_fields_error(self, payload):
+        """Error message for a payload that is not an object or lacks fields, else None."""
+        if not isinstance(payload, dict):
+            return INVALID_PAYLOAD_ERROR
+        missing_keys = [name for name in self.field_names if name not in payload]
+        if missing_keys:
+            return f"Missing required parameters: {', '.join(missing_keys)}"
+        return None
+
+    def validate(self, payload):
+        """Validates one payload. Returns the validated params or raises ValueError with the error message.
+
+        Checks run in declaration order with plain Python scalars, which is much cheaper than
+        NumPy for a single item; validate_many() yields the same messages.
+        """
+        error = self.missing_fields_error(payload)
+        if error:
+            raise ValueError(error)
+        validated = {}
+        for check in self.checks:
+            kind = check['kind']
+            if kind == 'rule':
+                if check['error_mask'](validated):
+                    raise ValueError(NUMERIC_ERROR_PREFIX + check['message'])
+                continue
+            name = check['name']
+            value = payload[name]
+            if kind == 'number':
+                try:
+                    value = int(value) if check['integer'] else float(value)
+                except (ValueError, TypeError, OverflowError) as e:
+                    raise ValueError(NUMERIC_ERROR_PREFIX + str(e))
+                above_minimum = value > check['min'] if check['exclusive_minimum'] else value >= check['min']
+                if not (above_minimum and value <= check['max']):
+                    raise ValueError(NUMERIC_ERROR_PREFIX + check['message'])
+            elif kind == 'choice':
+                if not (isinstance(value, str) and value in self.choice_sets[name]):
+                    raise ValueError(f"Invalid {check['label']}: {value}")
+            elif not isinstance(value, str): # text
+                raise ValueError(f"Invalid {check['label']}: {value}")
+            validated[name] = value
+        return validated
+
+    def validate_many(self, payloads):
+        """Validates a list of payloads.
+
+        Returns (validated, errors): validated has one entry per payload, the validated
+        params dict or None; errors is a list of {'index': i, 'error': message}.
+        """
+        try:
+            rows = list(map(self.get_fields, payloads))
+        except (KeyError, TypeError):
+            return self.validate_many_with_malformed(payloads)
+
+        count = len(rows)
+        raw_columns = dict(zip(self.field_names, zip(*rows))) if rows else {name: () for name in self.field_names}
+        alive = np.ones(count, dtype=bool)
+        messages = {} # First error per failing item
+
+        def reject(failed, message):
+            for index in np.flatnonzero(failed & alive).tolist():
+                messages[index] = message
+            alive[failed] = False
+
+        columns = {} # NumPy columns for numeric fields, used by range checks and rules
+        outputs = {} # Validated values per field, as Python objects
+        for check in self.checks:
+            kind = check['kind']
+            if kind == 'rule':
+                reject(np.asarray(check['error_mask'](columns), dtype=bool), NUMERIC_ERROR_PREFIX + check['message'])
+                continue
+            name = check['name']
+            values = raw_columns[name]
+            if kind == 'number':
+                column, outputs[name], conversion_errors = self.convert_numbers(values, check['integer'])
+                for index, message in conversion_errors.items():
+                    if alive[index]:
+                        messages[index] = message
+                        alive[index] = False
+                above_minimum = column > check['min'] if check['exclusive_minimum'] else column >= check['min']
+                reject(~(above_minimum & (column <= check['max'])), NUMERIC_ERROR_PREFIX + check['message'])
+                columns[name] = column
+                continue
+            outputs[name] = values
+            if kind == 'choice':
+                allowed = self.choice_sets[name]
+                try:
+                    all_allowed = allowed.issuperset(values)
+                except TypeError: # Unhashable values (lists, objects)
+                    all_allowed = False
+                if all_allowed:
+                    continue
+                is_valid = lambda value: isinstance(value, str) and value in allowed
+            else: # text
+                is_valid = lambda value: isinstance(value, str)
+            for index in np.flatnonzero(alive).tolist():
+                if not is_valid(values[index]):
+                    messages[index] = f"Invalid {check['label']}: {values[index]}"
+                    alive[index] = False
+
+        output_columns = [outputs[name] for name in self.field_names]
+        if alive.all():
+            validated = list(map(dict, map(zip, itertools.repeat(self.field_names), zip(*output_columns))))
+        else:
+            validated = [None] * count
+            for index in np.flatnonzero(alive).tolist():
+                validated[index] = dict(zip(self.field_names, [column[index] for column in output_columns]))
+        errors = [{'index': index, 'error': messages[index]} for index in sorted(messages)]
+        return validated, errors
+
+    def validate_many_with_malformed(self, payloads):
+        """validate_many() for batches containing non-objects or payloads with missing fields."""
+        validated = [None] * len(payloads)
+        errors = []
+        well_formed = []
+        for index, payload in enumerate(payloads):
+            error = self.missing_fields_error(payload)
+            if error:
+                errors.append({'index': index, 'error': error})
+            else:
+                well_formed.append(index)
+        checked, checked_errors = self.validate_many([payloads[index] for index in well_formed])
+        for position, params in enumerate(checked):
+            validated[well_formed[position]] = params
+        errors.extend({'index': well_formed[error['index']], 'error': error['error']} for error in checked_errors)
+        errors.sort(key=lambda error: error['index'])
+        return validated, errors
+
+    @staticmethod
+    def convert_numbers(values, integer):
+        """Converts a column with float()/int() semantics.
+
+        Returns (column, converted, errors): a float64 column for range checks, the converted
+        Python values, and {index: message} for items that could not be converted. Columns of
+        plain ints/floats (the usual JSON case) are handled by NumPy in one go; anything else
+        (strings, bools, None) falls back to per-item float()/int().
+        """
+        value_types = set(map(type, values))
+        if value_types <= ({int} if integer else {int, float}):
+            try:
+                column = np.array(values, dtype=np.float64)
+                return column, (list(values) if integer else column.tolist()), {}
+            except OverflowError:
+                pass # Ints beyond float range: convert one by one below
+
+        convert = int if integer else float
+        converted = []
+        errors = {}
+        for index, value in enumerate(values):
+            try:
+                converted.append(convert(value))
+            except (ValueError, TypeError, OverflowError) as e:
+                errors[index] = NUMERIC_ERROR_PREFIX + str(e)
+                converted.append(0)
+        if integer:
+            # Huge ints only need to compare as out of range
+            column = np.array([number if abs(number) < 2**53 else (math.inf if number > 0 else -math.inf)
+                               for number in converted], dtype=np.float64)
+        else:
+            column = np.array(converted, dtype=np.float64)
+        return column, converted, errors
+
+
+def compile_schema(checks):
+    """Compiles a list of checks (see simulation_checks) into a CompiledSchema."""
+    return CompiledSchema(checks)
+
+def validate_simulation_batch(schema, payloads, max_items, max_total_freq_steps):
+    """Validates a batched /simulate request (a JSON array of payloads).
+
+    Returns (validated, errors) like CompiledSchema.validate_many, so bad items are reported
+    by index without failing the rest. Raises ValueError if the batch as a whole is too big.
+    """
+    if len(payloads) > max_items:
+        raise ValueError(f"Too many simulations in one request (max {max_items}).")
+    validated, errors = schema.validate_many(payloads)
+    total_steps = sum(params['freqSteps'] for params in validated if params is not None)
+    if total_steps > max_total_freq_steps:
+        raise ValueError(f"Total Frequency Steps in one request must not exceed {max_total_freq_steps}.")
+    return validated, errors
@@ -405,6 +405,106 @@ function applyInitialTheme() {
 }
 
 
+// --- Results Rendering ---
+/**
+ * Updates the table/single display, calculation details and map from a results array.
+ * @param {Array<object>} resultsArray - An array of result objects from the backend.
+ * @param {object} params - The parameters the results were computed for (used for map coordinates).
+ */
+function renderResults(resultsArray, params) {
+     if (resultsArray && resultsArray.length > 0) {
+         const firstResult = resultsArray[0];
+         const centerIndex = Math.floor(resultsArray.length / 2);
+         const centerResult = resultsArray[centerIndex]; // Use center result for map line coloring
+
+         if (resultsArray.length === 1) {
+             updateSingleResultDisplay(firstResult);
+             updateCalcDetails(firstResult); // Update details with the single result
+         } else {
+             updateResultsTable(resultsArray);
+             updateCalcDetails(centerResult); // Update details with center result
+         }
+         // Update map using coordinates from input params & likelihood/SNR from center result
+         updateMap(params.txLat, params.txLon, params.rxLat, params.rxLon,
+                   centerResult.skywaveLikelihood, centerResult.groundWaveSNR);
+     } else {
+        console.warn("Received empty results array from server.");
+        showMessage("Received empty results from server.", "warning");
+        updateResultsTable([]); // Clear table
+        updateCalcDetails(null); // Clear details
+     }
+}
+
+
+// --- Live Link-Budget Updates ---
+// Power, antenna and noise inputs only affect the link budget, so once a full
+// simulation has run, changes to them are sent to /simulate/update which reuses
+// the cached propagation results on the server.
+let lastResultId = null;
+let lastSimParams = null;
+let liveUpdateTimer = null;
+let liveUpdateController = null;
+const LIVE_UPDATE_DELAY_MS = 75;
+
+/**
+ * Debounces link-budget input changes into a single /simulate/update call.
+ */
+function scheduleLiveUpdate() {
+    if (!lastResultId) return; // Nothing to update until a full simulation has run
+    clearTimeout(liveUpdateTimer);
+    liveUpdateTimer = setTimeout(handleLiveUpdate, LIVE_UPDATE_DELAY_MS);
+}
+
+/**
+ * Sends the current link-budget inputs to /simulate/update and re-renders the results.
+ * Falls back to a full simulation if the server no longer has the cached result.
+ */
+async function handleLiveUpdate() {
+    const txPowerW = parseFloat(txPowerInput.value);
+    if (!lastResultId || isNaN(txPowerW) || txPowerW <= 0) return; // Wait for a valid power value
+
+    const linkParams = {
+        resultId: lastResultId,
+        txPowerW: txPowerW,
+        txAntennaType: txAntennaTypeSelect.value,
+        txAntennaHeight: txAntennaHeightSelect.value,
+        rxAntennaType: rxAntennaTypeSelect.value,
+        rxAntennaHeight: rxAntennaHeightSelect.value,
+        noiseEnvironment: noiseEnvironmentSelect.value
+    };
+
+    // Only the latest update matters; cancel any request still in flight
+    if (liveUpdateController) liveUpdateController.abort();
+    liveUpdateController = new AbortController();
+
+    try {
+        const response = await fetch('/simulate/update', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', },
+            body: JSON.stringify(linkParams),
+            signal: liveUpdateController.signal,
+        });
+        if (response.status === 404) {
+            console.log("Cached result expired, running full simulation.");
+            lastResultId = null;
+            handleSimulation();
+            return;
+        }
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            showMessage(`Update failed: ${errorData.error || response.status}`, 'error');
+            return;
+        }
+        hideMessage();
+        const resultsArray = await response.json();
+        renderResults(resultsArray, lastSimParams);
+    } catch (error) {
+        if (error.name === 'AbortError') return; // Superseded by a newer update
+        console.error('Live Update Error:', error);
+    }
+}
+
+
 // --- Main Simulation Trigger ---
 /**
  * Gathers inputs, validates them, calls the backend API, and updates the UI.
@@ -452,6 +552,14 @@ async function handleSimulation() {
          return;
     }
 
+    // The full simulation supersedes any pending or in-flight link-budget update, which
+    // would otherwise render the previous result over this one. Link-budget changes made
+    // while it runs wait for the new result id.
+    clearTimeout(liveUpdateTimer);
+    if (liveUpdateController) liveUpdateController.abort();
+    liveUpdateController = null;
+    lastResultId = null;
+
     // Call Backend API
     try {
         console.log("Sending request to /simulate");
@@ -483,33 +591,16 @@ async function handleSimulation() {
         const resultsArray = await response.json();
         console.log("Received results:", resultsArray);
 
-        // Update UI
-         if (resultsArray && resultsArray.length > 0) {
-             const firstResult = resultsArray[0];
-             const centerIndex = Math.floor(resultsArray.length / 2);
-             const centerResult = resultsArray[centerIndex]; // Use center result for map line coloring
-
-             if (resultsArray.length === 1) {
-                 updateSingleResultDisplay(firstResult);
-                 updateCalcDetails(firstResult); // Update details with the single result
-             } else {
-                 updateResultsTable(resultsArray);
-                 updateCalcDetails(centerResult); // Update details with center result
-             }
-             // Update map using coordinates from input params & likelihood/SNR from center result
-             updateMap(params.txLat, params.txLon, params.rxLat, params.rxLon,
-                       centerResult.skywaveLikelihood, centerResult.groundWaveSNR);
-         } else {
-            console.warn("Received empty results array from server.");
-            showMessage("Received empty results from server.", "warning");
-            updateResultsTable([]); // Clear table
-            updateCalcDetails(null); // Clear details
-         }
+        // Remember the result id so link-budget changes can use /simulate/update
+        lastResultId = response.headers.get('X-Result-Id');
+        lastSimParams = params;
+        renderResults(resultsArray, params);
 
     } catch (error) {
         console.error('Simulation Error:', error);
         showMessage(`Simulation failed: ${error.message || 'Check console for details.'}`, 'error');
         // Clear results on error
+        lastResultId = null;
         updateResultsTable([]);
         updateCalcDetails(null);
     } finally {
@@ -522,6 +613,11 @@ async function handleSimulation() {
 // --- Event Listeners ---
 simulateBtn.addEventListener('click', handleSimulation);
 
+// Link-budget inputs update the current results live
+txPowerInput.addEventListener('input', scheduleLiveUpdate);
+[txAntennaTypeSelect, txAntennaHeightSelect, rxAntennaTypeSelect, rxAntennaHeightSelect, noiseEnvironmentSelect]
+    .forEach(select => select.addEventListener('change', scheduleLiveUpdate));
+
 // Add listener for the theme toggle button
 if (themeToggleButton) {
     themeToggleButton.addEventListener('click', toggleTheme);
@@ -0,0 +1,106 @@
+"""Great-circle control points and hop splitting, including the antipode, the poles and the date line."""
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+FRACTIONS = np.linspace(0, 1, 9)
+HALF_CIRCUMFERENCE_KM = math.pi * app.EARTH_RADIUS_KM
+
+
+def points(lat1, lon1, lat2, lon2, fractions=FRACTIONS):
+    """great_circle_points for one path; returns (distance_km, lat, lon)."""
+    lat1, lon1, lat2, lon2 = (np.array([float(value)]) for value in (lat1, lon1, lat2, lon2))
+    distance_km = app.calculate_distance_array(lat1, lon1, lat2, lon2)
+    lat, lon = app.great_circle_points(lat1, lon1, lat2, lon2, distance_km, fractions[None, :])
+    return distance_km[0], lat[0], lon[0]
+
+
+def distance(lat1, lon1, lat2, lon2):
+    return app.calculate_distance_array(*(np.array([float(value)]) for value in (lat1, lon1, lat2, lon2)))[0]
+
+
+def assert_evenly_spaced(distance_km, lat, lon):
+    """Each point lies at its fraction of the path from the start, so the points are on one great circle."""
+    for fraction, point_lat, point_lon in zip(FRACTIONS, lat, lon):
+        assert distance(lat[0], lon[0], point_lat, point_lon) == pytest.approx(fraction * distance_km, abs=1e-3)
+
+
+@pytest.mark.parametrize('path', [
+    (35.17, -79.41, 40.71, -74.00),
+    (-33.87, 151.21, 51.50, -0.12),
+    (10, 179.9, 10, -179.9), # Across the date line
+    (10, -179.9, 10, 179.9),
+    (60, 170, -20, -160),
+    (90, 0, 45, 100), # From a pole
+    (-30, 20, -90, 0), # To a pole
+])
+def test_points_run_evenly_between_the_endpoints(path):
+    distance_km, lat, lon = points(*path)
+    assert distance(lat[0], lon[0], path[0], path[1]) == pytest.approx(0, abs=1e-3)
+    assert distance(lat[-1], lon[-1], path[2], path[3]) == pytest.approx(0, abs=1e-3)
+    assert_evenly_spaced(distance_km, lat, lon)
+    assert np.all((lon >= -180) & (lon < 180))
+
+
+def test_date_line_path_stays_short():
+    distance_km, lat, lon = points(10, 179.9, 10, -179.9)
+    assert distance_km < 25
+    assert abs(lon[len(FRACTIONS) // 2]) == pytest.approx(180, abs=1e-6)
+
+
+def test_path_from_a_pole_follows_the_meridian():
+    _, lat, lon = points(90, 0, 45, 100)
+    assert np.all(np.diff(lat) < 0)
+    assert lon[1:] == pytest.approx(100)
+
+
+@pytest.mark.parametrize('antipodal_pair', [
+    ((0, 0, 0, 180), (0, 0, 0, -180)),
+    ((10, 0, -10, 180), (10, 0, -10, -180)),
+    ((-45, 120, 45, -60), (-45, 120, 45, 300 - 360)),
+])
+def test_antipodal_paths_are_routed_north_whatever_the_longitude_sign(antipodal_pair):
+    first, second = (points(*path) for path in antipodal_pair)
+    assert first[0] == pytest.approx(HALF_CIRCUMFERENCE_KM)
+    np.testing.assert_allclose(first[1], second[1], atol=1e-9)
+    np.testing.assert_allclose(first[2], second[2], atol=1e-9)
+    _, lat, lon = first
+    assert lat[1] > lat[0] and lon[1] == pytest.approx(lon[0]) # Due north
+    assert_evenly_spaced(*first)
+
+
+def test_pole_to_pole():
+    distance_km, lat, lon = points(90, 0, -90, 0)
+    assert distance_km == pytest.approx(HALF_CIRCUMFERENCE_KM)
+    np.testing.assert_allclose(lat, 90 - 180 * FRACTIONS, atol=1e-9)
+
+
+def test_hop_fractions():
+    max_hop_km = (1000.0, 400.0)
+    distance_km = np.array([10.0, 1000.0, 2000.0, HALF_CIRCUMFERENCE_KM])
+    hops, fractions, valid = app.get_hop_fractions(distance_km, max_hop_km)
+    expected_hops = np.ceil(np.maximum(1, distance_km[:, None] / max_hop_km))
+    np.testing.assert_array_equal(hops, expected_hops)
+    np.testing.assert_array_equal(valid.sum(axis=2), expected_hops)
+    assert fractions[2, 0, :2].tolist() == [0.25, 0.75]
+    for path, layer in np.ndindex(hops.shape):
+        path_hops = hops[path, layer]
+        hop_fractions = fractions[path, layer]
+        # Real hops are the midpoints of equal hops; padding repeats the last one
+        np.testing.assert_allclose(hop_fractions[:path_hops], (np.arange(path_hops) + 0.5) / path_hops)
+        assert np.all(hop_fractions[path_hops:] == hop_fractions[path_hops - 1])
+        assert distance_km[path] / path_hops <= max_hop_km[layer]
+
+
+def test_antipodal_geometry_uses_the_hop_limits():
+    geometry = app.get_path_geometry(np.array([0.0]), np.array([0.0]), np.array([0.0]), np.array([180.0]))
+    assert geometry['hops'][0].tolist() == [math.ceil(HALF_CIRCUMFERENCE_KM / app.F2_MAX_HOP_KM),
+                                           math.ceil(HALF_CIRCUMFERENCE_KM / app.E_MAX_HOP_KM)]
+    assert np.all(np.isfinite(geometry['lat'])) and np.all(np.isfinite(geometry['lon']))
@@ -0,0 +1,52 @@
+"""SWPC data is refreshed in the background; requests never wait out its retries."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+PRODUCT_KEY = 'kp_7day'
+URL = app.NOAA_URLS[PRODUCT_KEY]
+
+
+@pytest.fixture
+def stalled_swpc(monkeypatch):
+    """Makes upstream fetches block until the returned event is set, then store 'fresh'."""
+    release = threading.Event()
+    fetches = []
+
+    def fetch_noaa_data(product_key, url, cache_entry, now):
+        fetches.append(product_key)
+        release.wait(5)
+        app.store_noaa_data(product_key, ['fresh'], {}, now)
+    monkeypatch.setattr(app, 'fetch_noaa_data', fetch_noaa_data)
+    monkeypatch.setattr(app, 'NOAA_CACHE', {})
+    monkeypatch.setattr(app, 'NOAA_REFRESH_THREADS', {})
+    yield release, fetches
+    release.set()
+
+
+def test_stale_data_is_served_while_refreshing(stalled_swpc):
+    release, fetches = stalled_swpc
+    app.NOAA_CACHE[PRODUCT_KEY] = {'data': ['stale'], 'timestamp': 0, 'failed_at': 0}
+    started = time.monotonic()
+    assert [app.get_noaa_data(PRODUCT_KEY, URL) for _ in range(3)] == [['stale']] * 3
+    assert time.monotonic() - started < 0.5
+    assert fetches == [PRODUCT_KEY] # One refresh, however many callers
+    release.set()
+    app.NOAA_REFRESH_THREADS[PRODUCT_KEY].join(1)
+    assert app.get_noaa_data(PRODUCT_KEY, URL) == ['fresh']
+
+
+def test_cold_cache_waits_a_bounded_time(stalled_swpc):
+    release, _ = stalled_swpc
+    started = time.monotonic()
+    assert app.get_noaa_data(PRODUCT_KEY, URL, wait_seconds=0.2) is None # Caller falls back to defaults
+    assert time.monotonic() - started < 1
+    release.set()
+    assert app.get_noaa_data(PRODUCT_KEY, URL, wait_seconds=None) == ['fresh']
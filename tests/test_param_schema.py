@@ -0,0 +1,88 @@
+"""validate() and validate_many() must accept and reject payloads identically."""
+import os
+import random
+import sys
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+import param_schema
+
+VALID_PAYLOAD = dict(app.WARM_UP_PARAMS)
+
+EDGE_PAYLOADS = [
+    VALID_PAYLOAD,
+    dict(VALID_PAYLOAD, freqSteps=10**400),
+    dict(VALID_PAYLOAD, freqSteps=-10**400),
+    dict(VALID_PAYLOAD, freqSteps=2**53),
+    dict(VALID_PAYLOAD, txLat=10**400),
+    dict(VALID_PAYLOAD, freqSteps=2.5),
+    dict(VALID_PAYLOAD, freqSteps='7'),
+    dict(VALID_PAYLOAD, txLat='abc'),
+    dict(VALID_PAYLOAD, txLat=None),
+    dict(VALID_PAYLOAD, txLat=True),
+    dict(VALID_PAYLOAD, txLat=float('nan')),
+    dict(VALID_PAYLOAD, txLon=float('inf')),
+    dict(VALID_PAYLOAD, txPowerW=0),
+    dict(VALID_PAYLOAD, startFreq=20.0, endFreq=10.0),
+    dict(VALID_PAYLOAD, startFreq=10.0, endFreq=10.0, freqSteps=5),
+    dict(VALID_PAYLOAD, txAntennaType='Rhombic'),
+    dict(VALID_PAYLOAD, txAntennaType=['Dipole']),
+    dict(VALID_PAYLOAD, noiseEnvironment=None),
+    {key: value for key, value in VALID_PAYLOAD.items() if key != 'rxLon'},
+    {},
+    'not an object',
+    None,
+]
+
+
+def validate_one(schema, payload):
+    """validate() as (params, None) or (None, error message)."""
+    try:
+        return schema.validate(payload), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def assert_same_results(schema, payloads):
+    validated, errors = schema.validate_many(payloads)
+    errors_by_index = {error['index']: error['error'] for error in errors}
+    assert len(validated) == len(payloads)
+    for index, payload in enumerate(payloads):
+        assert validate_one(schema, payload) == (validated[index], errors_by_index.get(index)), payload
+
+
+def random_value(rng, value):
+    choice = rng.random()
+    if choice < 0.5:
+        return value
+    if choice < 0.65 and isinstance(value, (int, float)):
+        return value * rng.choice([-1, 0.5, 3, 1000])
+    return rng.choice([None, True, 'x', '12', [], 10**400, -1, 0, 1.8, 30.0, 100, 101, float('nan'), 'Dipole'])
+
+
+def test_edge_cases_match():
+    assert_same_results(app.SIMULATION_SCHEMA, EDGE_PAYLOADS)
+
+
+def test_each_edge_case_alone_matches():
+    # A batch of plain numbers takes NumPy's fast path; a mixed batch falls back per item
+    for payload in EDGE_PAYLOADS:
+        assert_same_results(app.SIMULATION_SCHEMA, [payload])
+
+
+def test_huge_integers_are_range_errors():
+    payloads = [dict(VALID_PAYLOAD, freqSteps=10**400), dict(VALID_PAYLOAD, freqSteps=-10**400)]
+    message = param_schema.NUMERIC_ERROR_PREFIX + "Frequency Steps must be between 1 and 100."
+    _, errors = app.SIMULATION_SCHEMA.validate_many(payloads)
+    assert errors == [{'index': 0, 'error': message}, {'index': 1, 'error': message}]
+
+
+def test_random_payloads_match():
+    rng = random.Random(1)
+    payloads = [{key: random_value(rng, value) for key, value in VALID_PAYLOAD.items() if rng.random() > 0.02}
+                for _ in range(2000)]
+    assert_same_results(app.SIMULATION_SCHEMA, payloads)
+    update_payloads = [{key: random_value(rng, value) for key, value in dict(VALID_PAYLOAD, resultId='abc').items()}
+                       for _ in range(500)]
+    assert_same_results(app.LINK_BUDGET_SCHEMA, update_payloads)
@@ -0,0 +1,78 @@
+"""Popular path tracking and the persisted, cross-process popular path list."""
+import json
+import os
+import sys
+
+import pytest
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def path_params(tx_lat):
+    return dict(app.get_path_params(app.WARM_UP_PARAMS), txLat=tx_lat)
+
+
+def popular_path(tx_lat, score):
+    params = path_params(tx_lat)
+    return app.get_path_key(params), score, params
+
+
+@pytest.fixture
+def popular_paths_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'popular_paths.json')
+    monkeypatch.setattr(app, 'POPULAR_PATHS_FILE', path)
+    return path
+
+
+def saved_scores(popular_paths_file):
+    with open(popular_paths_file, encoding='utf-8') as f:
+        return {entry['txLat']: entry['score'] for entry in json.load(f)}
+
+
+@pytest.fixture
+def tracked_paths(monkeypatch):
+    monkeypatch.setattr(app, 'PRECOMPUTE_ENABLED', True)
+    monkeypatch.setattr(app, 'MAX_TRACKED_PATHS', 20)
+    monkeypatch.setattr(app, 'PATH_POPULARITY', {})
+    monkeypatch.setattr(app, 'PATH_LATEST_PARAMS', {})
+    return app.PATH_POPULARITY
+
+
+def test_new_paths_are_admitted_when_full(tracked_paths):
+    for _ in range(3):
+        app.record_path_request(path_params(-45.0))
+    for i in range(100): # A burst of one-off paths
+        app.record_path_request(path_params(i / 2))
+    assert len(tracked_paths) <= app.MAX_TRACKED_PATHS
+    assert tracked_paths[app.get_path_key(path_params(-45.0))] == 3
+    assert tracked_paths[app.get_path_key(path_params(49.5))] == 1
+    assert set(tracked_paths) == set(app.PATH_LATEST_PARAMS)
+
+
+def test_saves_from_several_processes_are_merged(popular_paths_file):
+    # Two workers with different traffic, then a master that only has an old copy
+    app.save_popular_paths([popular_path(10.0, 5.0), popular_path(20.0, 1.0)])
+    app.save_popular_paths([popular_path(20.0, 3.0), popular_path(30.0, 2.0)])
+    app.save_popular_paths([popular_path(10.0, 0.5)])
+    scores = saved_scores(popular_paths_file)
+    assert scores == pytest.approx({10.0: 5.0, 20.0: 3.0, 30.0: 2.0}, rel=1e-3)
+
+
+def test_saved_scores_age_with_time(popular_paths_file):
+    half_life = app.PATH_SCORE_HALF_LIFE_SECONDS
+    now = 10 * half_life
+    entries = [dict(path_params(10.0), score=8.0, savedAt=now - half_life), # Aged to 4
+               dict(path_params(20.0), score=8.0, savedAt=0), # Aged below MIN_PATH_SCORE, so forgotten
+               dict(path_params(30.0), score=8.0)] # Lists saved before savedAt existed don't age
+    with open(popular_paths_file, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    scores = {params['txLat']: score for _, score, params in app.read_popular_paths(now)}
+    assert scores == pytest.approx({10.0: 4.0, 30.0: 8.0})
+
+
+def test_invalid_entries_are_skipped(popular_paths_file):
+    with open(popular_paths_file, 'w', encoding='utf-8') as f:
+        json.dump([dict(path_params(10.0), score=2.0), dict(path_params(10.0), txLat=500), 'x'], f)
+    assert [params['txLat'] for _, _, params in app.read_popular_paths(0)] == [10.0]
@@ -0,0 +1,60 @@
+"""serialize_results must produce exactly the JSON of the row dicts (what jsonify sent before)."""
+import itertools
+import json
+import os
+import random
+import sys
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+INDICES = [app.WARM_UP_INDICES, {'sfi': 300, 'ssn': 250, 'kp': 8, 'ap': 240}]
+
+
+def dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def random_params(rng):
+    start_freq = rng.uniform(1.8, 30)
+    return dict(app.WARM_UP_PARAMS,
+                txLat=rng.uniform(-90, 90), txLon=rng.uniform(-180, 180),
+                rxLat=rng.uniform(-90, 90), rxLon=rng.uniform(-180, 180),
+                startFreq=start_freq, endFreq=rng.uniform(start_freq, 30), freqSteps=rng.randint(1, 100),
+                txPowerW=rng.choice([0.001, 5, 100, 10000]),
+                txAntennaType=rng.choice(app.ALLOWED_ANTENNA_TYPES), txAntennaHeight=rng.choice(app.ALLOWED_ANTENNA_HEIGHTS),
+                rxAntennaType=rng.choice(app.ALLOWED_ANTENNA_TYPES), rxAntennaHeight=rng.choice(app.ALLOWED_ANTENNA_HEIGHTS),
+                noiseEnvironment=rng.choice(app.ALLOWED_NOISE_ENV))
+
+
+def assert_serializes_like_dicts(stage, params):
+    link_budget = app.run_link_budget_stage(stage, params)
+    assert app.serialize_results(stage, link_budget) == dumps(app.results_to_dicts(stage, link_budget))
+
+
+def test_random_paths_match():
+    rng = random.Random(7)
+    for real_time_indices in INDICES:
+        params_list = [random_params(rng) for _ in range(200)]
+        for stage, params in zip(app.run_propagation_stages(params_list, real_time_indices), params_list):
+            assert_serializes_like_dicts(stage, params)
+
+
+def test_edge_cases_match():
+    # Antipodal, polar and date-line paths, a single frequency, and no transmit power (-Infinity SNR)
+    paths = [(0, 0, 0, 180), (90, 0, -90, 0), (10, 179.9, 10, -179.9), (35.17, -79.41, 35.17, -79.4)]
+    for (tx_lat, tx_lon, rx_lat, rx_lon), steps, power in itertools.product(paths, (1, 100), (100, 0)):
+        params = dict(app.WARM_UP_PARAMS, txLat=tx_lat, txLon=tx_lon, rxLat=rx_lat, rxLon=rx_lon, freqSteps=steps)
+        stage = app.run_propagation_stage(params, INDICES[1])
+        assert_serializes_like_dicts(stage, dict(params, txPowerW=power))
+
+
+def test_batch_body_matches():
+    payloads = [app.WARM_UP_PARAMS, 'not an object', dict(app.WARM_UP_PARAMS, freqSteps=3, txLat=-60)]
+    validated, errors = app.validate_simulation_batch(payloads)
+    batch = app.run_simulation_batch(validated, INDICES[0])
+    expected = {'errors': errors, 'results': [
+        {'index': index, 'results': app.results_to_dicts(stage, app.run_link_budget_stage(stage, params))}
+        for index, params, stage in batch]}
+    assert ''.join(app.iter_simulation_batch_json(errors, batch)) == dumps(expected) + '\n'
@@ -0,0 +1,43 @@
+"""The per-process cache of propagation stages behind /simulate/update."""
+import collections
+import os
+import sys
+
+import pytest
+
+# The app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+STAGE = app.run_propagation_stage(app.WARM_UP_PARAMS, app.WARM_UP_INDICES)
+ENTRY_BYTES = STAGE['columns'].nbytes + app.SIMULATION_CACHE_ENTRY_OVERHEAD_BYTES
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(app, 'SIMULATION_CACHE', collections.OrderedDict())
+    monkeypatch.setattr(app, 'simulation_cache_bytes', 0)
+    monkeypatch.setattr(app, 'SIMULATION_CACHE_MAX_BYTES', 3 * ENTRY_BYTES)
+
+
+def test_least_recently_used_entry_is_evicted():
+    first, second, third = (app.store_propagation_stage(STAGE) for _ in range(3))
+    assert app.get_propagation_stage(first) is STAGE # Now the most recently used
+    fourth = app.store_propagation_stage(STAGE)
+    assert app.get_propagation_stage(second) is None
+    assert all(app.get_propagation_stage(result_id) is STAGE for result_id in (first, third, fourth))
+    assert app.simulation_cache_bytes == 3 * ENTRY_BYTES
+
+
+def test_use_extends_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, 'time', lambda: now[0])
+    used, unused = app.store_propagation_stage(STAGE), app.store_propagation_stage(STAGE)
+    now[0] += app.SIMULATION_CACHE_DURATION_SECONDS - 1
+    assert app.get_propagation_stage(used) is STAGE
+    now[0] += 2
+    assert app.get_propagation_stage(unused) is None
+    assert app.get_propagation_stage(used) is STAGE
+    app.store_propagation_stage(STAGE) # Drops the expired entry
+    assert unused not in app.SIMULATION_CACHE
+    assert app.simulation_cache_bytes == 2 * ENTRY_BYTES